@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from api import dbstats, metrics, signals  # noqa: F401
+        from api.pdf import register_fonts
+        register_fonts()
@@ -0,0 +1,293 @@
+import asyncio
+import math
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import (APIException, NotFound,
+                                       ValidationError)
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.autocomplete import ingredient_index
+from api.filters import RecipeFilter
+from api.mixins import patch_cache_headers, version_etag
+from api.pagination import RecipePagination, keyset_filter
+from api.readers import RecipeReader, recipe_rows
+from api.relations import get_relations
+from api.renderers import FastJSONRenderer
+from api.response_cache import (cache_key, get_cached_response,
+                                store_response)
+from api.serializers import IngredientSerializer, TagSerializer
+from api.views import (RECIPE_LIST_VERSIONS, IngredientViewSet,
+                       RecipeViewSet, TagViewSet)
+from recipes.models import Ingredient, Recipe, Tag
+
+SAFE_METHODS = ('GET', 'HEAD')
+JSON_CONTENT_TYPE = 'application/json'
+
+
+def render(data, status=200, endpoint=None):
+    """Тот же JSON, что отдает DRF JSONRenderer."""
+    response = HttpResponse(
+        FastJSONRenderer().render(data),
+        status=status,
+        content_type=JSON_CONTENT_TYPE
+    )
+    response.endpoint = endpoint
+    return response
+
+
+async def authenticate(request):
+    """DRF Request с пользователем из DEFAULT_AUTHENTICATION_CLASSES."""
+    drf_request = Request(request, authenticators=[
+        authentication()
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    await sync_to_async(lambda: drf_request.user)()
+    return drf_request
+
+
+def read_view(handler, viewset, actions, endpoint):
+    """Асинхронное чтение; остальные методы уходят в синхронный ViewSet."""
+    sync_view = viewset.as_view(actions)
+
+    async def view(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+        try:
+            drf_request = await authenticate(request)
+            return await handler(drf_request, *args, **kwargs)
+        except APIException as error:
+            response = render(
+                error.detail if isinstance(error, ValidationError)
+                else {'detail': error.detail},
+                status=error.status_code,
+                endpoint=endpoint
+            )
+            if error.status_code == 401:
+                response['WWW-Authenticate'] = 'Token'
+            return response
+
+    view.csrf_exempt = True
+    return view
+
+
+async def conditional(request, names, max_age, produce, endpoint,
+                      anonymous_cache=False):
+    """Асинхронный аналог ConditionalGetMixin.conditional."""
+    etag, last_modified, versions = await sync_to_async(version_etag)(
+        request, names
+    )
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified
+    )
+    if response is None:
+        key = None
+        if anonymous_cache and not request.user.is_authenticated:
+            key = cache_key(request, JSON_CONTENT_TYPE, versions)
+            response = await sync_to_async(get_cached_response)(key)
+        if response is None:
+            response = render(await produce(), endpoint=endpoint)
+            if key is not None:
+                await sync_to_async(store_response)(key, response)
+        response.endpoint = endpoint
+    patch_cache_headers(request, response, etag, last_modified, max_age)
+    return response
+
+
+def not_found(model):
+    """Сообщение как у get_object_or_404 в синхронных ViewSet."""
+    return NotFound(
+        f'No {model._meta.object_name} matches the given query.'
+    )
+
+
+async def fetch(queryset):
+    return [obj async for obj in queryset]
+
+
+async def recipe_page(request, queryset, paginator):
+    """Страница рецептов: строки и COUNT(*) запрашиваются параллельно."""
+    page_size = paginator.get_page_size(request)
+    params = request.query_params
+    if paginator.uses_keyset(queryset, request):
+        cursor = params[paginator.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(keyset_filter(
+                paginator.cursor_ordering, paginator.decode_cursor(cursor)
+            ))
+        paginator.request = request
+        paginator.keyset = True
+        page = paginator.cut_page(
+            await fetch(queryset.order_by(
+                *(f'-{field}' for field in paginator.cursor_ordering)
+            )[:page_size + 1]),
+            page_size
+        )
+        return page, OrderedDict([
+            ('next', paginator.get_next_link()),
+            ('previous', None),
+        ])
+
+    try:
+        number = int(params.get(paginator.page_query_param, 1))
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise NotFound(paginator.invalid_page_message)
+    offset = (number - 1) * page_size
+    count, page = await asyncio.gather(
+        queryset.acount(), fetch(queryset[offset:offset + page_size])
+    )
+    pages = max(math.ceil(count / page_size), 1)
+    if number > pages:
+        raise NotFound(paginator.invalid_page_message)
+
+    url = request.build_absolute_uri()
+    previous = None
+    if number == 2:
+        previous = remove_query_param(url, paginator.page_query_param)
+    elif number > 2:
+        previous = replace_query_param(
+            url, paginator.page_query_param, number - 1
+        )
+    return page, OrderedDict([
+        ('count', count),
+        ('next', replace_query_param(
+            url, paginator.page_query_param, number + 1
+        ) if number < pages else None),
+        ('previous', previous),
+    ])
+
+
+async def recipe_list(request):
+    async def produce():
+        filterset = RecipeFilter(
+            request.query_params, queryset=Recipe.objects.all(),
+            request=request
+        )
+        if not await sync_to_async(filterset.is_valid)():
+            raise ValidationError(filterset.errors)
+        queryset = await sync_to_async(lambda: filterset.qs)()
+        (page, links), _ = await asyncio.gather(
+            recipe_page(request, recipe_rows(queryset), RecipePagination()),
+            sync_to_async(get_relations)(request)
+        )
+        links['results'] = await sync_to_async(
+            lambda: RecipeReader(request).build(page)
+        )()
+        return links
+
+    return await conditional(
+        request, RECIPE_LIST_VERSIONS, RecipeViewSet.cache_max_age,
+        produce, 'RecipeViewSet.list', anonymous_cache=True
+    )
+
+
+async def recipe_detail(request, pk):
+    author_id = await Recipe.objects.filter(pk=pk).values_list(
+        'author_id', flat=True
+    ).afirst()
+    if author_id is None:
+        raise not_found(Recipe)
+
+    async def produce():
+        row, _ = await asyncio.gather(
+            recipe_rows(Recipe.objects.all()).aget(pk=pk),
+            sync_to_async(get_relations)(request)
+        )
+        rows = await sync_to_async(
+            lambda: RecipeReader(request).build([row])
+        )()
+        return rows[0]
+
+    return await conditional(
+        request,
+        (f'recipe:{pk}', 'tags', 'ingredients', f'user:{author_id}'),
+        RecipeViewSet.cache_max_age,
+        produce,
+        'RecipeViewSet.retrieve',
+        anonymous_cache=True
+    )
+
+
+async def tag_list(request):
+    async def produce():
+        tags = [tag async for tag in Tag.objects.all().aiterator()]
+        return TagSerializer(tags, many=True).data
+
+    return await conditional(
+        request, ('tags',), TagViewSet.cache_max_age, produce,
+        'TagViewSet.list'
+    )
+
+
+async def tag_detail(request, pk):
+    async def produce():
+        try:
+            return TagSerializer(await Tag.objects.aget(pk=pk)).data
+        except Tag.DoesNotExist:
+            raise not_found(Tag)
+
+    return await conditional(
+        request, ('tags',), TagViewSet.cache_max_age, produce,
+        'TagViewSet.retrieve'
+    )
+
+
+async def ingredient_list(request):
+    async def produce():
+        return await sync_to_async(ingredient_index.search)(
+            request.query_params.get('name', ''),
+            version=request.versions['ingredients']
+        )
+
+    return await conditional(
+        request, ('ingredients',), IngredientViewSet.cache_max_age,
+        produce, 'IngredientViewSet.list'
+    )
+
+
+async def ingredient_detail(request, pk):
+    async def produce():
+        try:
+            ingredient = await Ingredient.objects.aget(pk=pk)
+        except Ingredient.DoesNotExist:
+            raise not_found(Ingredient)
+        return IngredientSerializer(ingredient).data
+
+    return await conditional(
+        request, ('ingredients',), IngredientViewSet.cache_max_age,
+        produce, 'IngredientViewSet.retrieve'
+    )
+
+
+recipe_list_view = read_view(
+    recipe_list, RecipeViewSet, {'get': 'list', 'post': 'create'},
+    'RecipeViewSet.list'
+)
+recipe_detail_view = read_view(
+    recipe_detail, RecipeViewSet,
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'},
+    'RecipeViewSet.retrieve'
+)
+tag_list_view = read_view(
+    tag_list, TagViewSet, {'get': 'list'}, 'TagViewSet.list'
+)
+tag_detail_view = read_view(
+    tag_detail, TagViewSet, {'get': 'retrieve'}, 'TagViewSet.retrieve'
+)
+ingredient_list_view = read_view(
+    ingredient_list, IngredientViewSet, {'get': 'list', 'post': 'create'},
+    'IngredientViewSet.list'
+)
+ingredient_detail_view = read_view(
+    ingredient_detail, IngredientViewSet,
+    {'get': 'retrieve', 'put': 'update', 'patch': 'partial_update',
+     'delete': 'destroy'},
+    'IngredientViewSet.retrieve'
+)
@@ -0,0 +1,107 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.versions import get_version, shared_cache
+
+SHARED_KEY = 'auth_token:{}'
+
+
+def auth_version(user_id):
+    return get_version(f'auth:{user_id}')
+
+
+class TokenCache:
+    """Кэш token → пользователь: LRU в памяти воркера и общий кэш.
+
+    Каждая запись хранит версию auth:<id> пользователя; ее сдвигают
+    сигналы при сохранении пользователя (смена пароля, деактивация)
+    и удалении токена (logout), и устаревшая запись не используется.
+    Кэш работает, только когда метки версий лежат в общем кэше: иначе
+    их проверка сама стоит запроса к БД.
+    """
+
+    def __init__(self, size, ttl, alias=None):
+        self.size = size
+        self.ttl = ttl
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @property
+    def enabled(self):
+        return shared_cache()
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < now:
+                del self._entries[key]
+                entry = None
+            elif entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(SHARED_KEY.format(key))
+            if entry is not None:
+                self.remember(key, *entry)
+        if entry is None:
+            return None
+        user, version = entry[:2]
+        if version != auth_version(user.pk):
+            self.evict(key)
+            return None
+        return copy.copy(user)
+
+    def remember(self, key, user, version):
+        with self._lock:
+            self._entries[key] = (user, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def set(self, key, user):
+        version = auth_version(user.pk)
+        self.remember(key, user, version)
+        if self.shared is not None:
+            self.shared.set(SHARED_KEY.format(key), (user, version), self.ttl)
+
+    def evict(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.shared is not None:
+            self.shared.delete(SHARED_KEY.format(key))
+
+
+token_cache = TokenCache(
+    settings.TOKEN_CACHE_SIZE,
+    settings.TOKEN_CACHE_TTL,
+    settings.TOKEN_CACHE_ALIAS
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к БД для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        if not token_cache.enabled:
+            return super().authenticate_credentials(key)
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, Token(key=key, user=user)
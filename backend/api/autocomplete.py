@@ -0,0 +1,69 @@
+import bisect
+import heapq
+import threading
+
+from api.versions import bump_version, get_version
+from recipes.models import Ingredient
+
+AUTOCOMPLETE_LIMIT = 50
+
+
+class IngredientIndex:
+    """Отсортированный индекс ингредиентов в памяти воркера.
+
+    Ключи приведены к casefold, поиск по префиксу идет бинарным поиском,
+    затем добираются совпадения по подстроке. Индекс перестраивается
+    лениво, когда меняется метка версии ingredients.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._entries = []
+
+    def invalidate(self):
+        bump_version('ingredients')
+
+    def _load(self, version):
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit
+            in Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        )
+        self._keys = [row[0] for row in rows]
+        self._entries = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        self._version = version
+
+    def _ensure_loaded(self, version=None):
+        if version is None:
+            version = get_version('ingredients')
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._load(version)
+
+    def search(self, query, limit=AUTOCOMPLETE_LIMIT, version=None):
+        """Поиск по индексу; version — уже прочитанная метка ingredients."""
+        self._ensure_loaded(version)
+        keys, entries = self._keys, self._entries
+        query = query.strip().casefold()
+        start = bisect.bisect_left(keys, query)
+        end = bisect.bisect_left(keys, query + '\uffff', lo=start)
+        result = entries[start:min(end, start + limit)]
+        if len(result) < limit and query:
+            positions = (
+                (key.find(query), index) for index, key in enumerate(keys)
+            )
+            substring = heapq.nsmallest(
+                limit - len(result),
+                (item for item in positions if item[0] > 0)
+            )
+            result += [entries[index] for _, index in substring]
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -1,39 +1,95 @@
-from django.http import HttpResponse
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+import csv
 
-from recipes.models import Ingredient
+from django.db.models import F, Sum
+from django.http import HttpResponse, StreamingHttpResponse
+from reportlab.pdfgen import canvas
 
+from api.pdf import draw_pages
+from recipes.models import RecipeIngredient
 
-def shopping_cart_pdf(shopping_list):
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'
-             ] = 'attachment; filename="shopping_list.pdf"'
+TITLE = 'Список покупок'
+FILENAME = 'shopping_list'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единицы измерения')
 
-    p = canvas.Canvas(response)
 
-    pdfmetrics.registerFont(
-        TTFont(
-            'Manrope',
-            'Manrope-Regular.ttf'
+def shopping_list(user):
+    """Суммирует ингредиенты из корзины пользователя одним запросом."""
+    return (
+        RecipeIngredient.objects.filter(recipe__cart__user=user)
+        .values(
+            name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit')
         )
+        .annotate(total_amount=Sum('amount'))
+        .order_by('name', 'measurement_unit')
     )
 
-    p.setFont('Manrope', 18)
-    p.drawString(250, 800, 'Список покупок')
 
-    y = 750
+def shopping_list_line(item):
+    return (
+        f'{item["name"]} - {item["total_amount"]} '
+        f'{item["measurement_unit"]}'
+    )
 
-    for item in shopping_list:
-        ingredient = Ingredient.objects.get(id=item['ingredient'])
-        p.drawString(
-            50,
-            y,
-            f'{ingredient.name} - {item["total_amount"]} г'
-        )
-        y -= 20
 
-    p.showPage()
-    p.save()
+def attachment(response, extension):
+    response['Content-Disposition'
+             ] = f'attachment; filename="{FILENAME}.{extension}"'
+    return response
+
+
+def shopping_cart_pdf(shopping_list):
+    response = attachment(HttpResponse(content_type='application/pdf'), 'pdf')
+
+    draw_pages(
+        canvas.Canvas(response),
+        TITLE,
+        (shopping_list_line(item) for item in shopping_list)
+    )
     return response
+
+
+def shopping_cart_txt(shopping_list):
+    def lines():
+        yield f'{TITLE}\n\n'
+        for item in shopping_list:
+            yield f'{shopping_list_line(item)}\n'
+
+    return attachment(
+        StreamingHttpResponse(
+            lines(), content_type='text/plain; charset=utf-8'
+        ),
+        'txt'
+    )
+
+
+class Echo:
+    """Псевдо-буфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_cart_csv(shopping_list):
+    writer = csv.writer(Echo())
+
+    def rows():
+        yield writer.writerow(CSV_HEADER)
+        for item in shopping_list:
+            yield writer.writerow((
+                item['name'],
+                item['total_amount'],
+                item['measurement_unit']
+            ))
+
+    return attachment(
+        StreamingHttpResponse(rows(), content_type='text/csv; charset=utf-8'),
+        'csv'
+    )
+
+
+SHOPPING_LIST_FORMATS = {
+    'pdf': shopping_cart_pdf,
+    'txt': shopping_cart_txt,
+    'csv': shopping_cart_csv,
+}
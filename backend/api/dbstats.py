@@ -0,0 +1,52 @@
+import os
+import threading
+from collections import Counter
+
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_lock = threading.Lock()
+_opened = Counter()
+_requests = Counter()
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    with _lock:
+        _opened[connection.alias] += 1
+
+
+@receiver(request_finished)
+def request_done(**kwargs):
+    with _lock:
+        _requests['total'] += 1
+
+
+def pool_stats():
+    """Счетчики соединений текущего воркера по алиасам БД.
+
+    opened — сколько раз Django открывал соединение; при рабочем
+    CONN_MAX_AGE оно растет намного медленнее числа запросов.
+    """
+    with _lock:
+        requests = _requests['total']
+        opened = dict(_opened)
+    return {
+        'pid': os.getpid(),
+        'requests': requests,
+        'databases': {
+            alias: {
+                'opened': opened.get(alias, 0),
+                'conn_max_age': connections[alias].settings_dict[
+                    'CONN_MAX_AGE'
+                ],
+                'health_checks': connections[alias].settings_dict[
+                    'CONN_HEALTH_CHECKS'
+                ],
+                'connected': connections[alias].connection is not None,
+            }
+            for alias in connections
+        },
+    }
@@ -0,0 +1,127 @@
+import heapq
+
+from django.db import transaction
+
+from api.pagination import keyset_filter
+from recipes.models import FeedEntry, Recipe
+from users.models import FoodgramUser, Subscription
+
+FANOUT_LIMIT = 1000
+FANOUT_BATCH_SIZE = 500
+BACKFILL_SIZE = 50
+
+
+def is_popular(author):
+    """Рецепты популярных авторов не раскладываются по лентам."""
+    return author.subscribers_count >= FANOUT_LIMIT
+
+
+def fan_out(recipe):
+    """Записывает новый рецепт в ленты подписчиков автора."""
+    if is_popular(recipe.author):
+        return
+    followers = Subscription.objects.filter(
+        author_id=recipe.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe.pk,
+                author_id=recipe.author_id,
+                pub_date=recipe.pub_date
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fill(user_ids, author_id):
+    """Записывает в ленты user_ids последние рецепты автора."""
+    recipes = list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id'
+    ).values_list('id', 'pub_date')[:BACKFILL_SIZE])
+    if not recipes:
+        return
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date
+            )
+            for user_id in user_ids
+            for recipe_id, pub_date in recipes
+        ),
+        batch_size=FANOUT_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author):
+    """Добавляет в ленту последние рецепты автора при подписке."""
+    if is_popular(author):
+        return
+    fill([user_id], author.pk)
+
+
+def drop(user_id, author_id):
+    """Убирает рецепты автора из ленты после отписки.
+
+    Пока автор популярен, его рецепты в ленты не раскладываются, а
+    ниже FANOUT_LIMIT лента читается только из FeedEntry. Поэтому
+    отписка, опустившая автора ниже порога, раскладывает его последние
+    рецепты по лентам оставшихся подписчиков. Вызывается в транзакции
+    отписки: строка автора заблокирована UPDATE счетчика, и порог
+    пересекает ровно одна отписка.
+    """
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+    subscribers = FoodgramUser.objects.filter(pk=author_id).values_list(
+        'subscribers_count', flat=True
+    ).first()
+    if subscribers == FANOUT_LIMIT - 1:
+        followers = Subscription.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        transaction.on_commit(
+            lambda: fill(followers.iterator(), author_id)
+        )
+
+
+def feed_page(user, after, limit):
+    """Страница ленты: записи из таблицы плюс рецепты популярных авторов.
+
+    Обе части выбираются по ключу (pub_date, id) не больше limit строк
+    и сливаются heapq.merge, рецепты подгружаются одним in_bulk.
+    """
+    popular = list(Subscription.objects.filter(
+        user=user, author__subscribers_count__gte=FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+
+    entries = FeedEntry.objects.filter(user=user).exclude(
+        author_id__in=popular
+    )
+    if after:
+        entries = entries.filter(
+            keyset_filter(('pub_date', 'recipe_id'), after)
+        )
+    sources = [entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id'
+    )[:limit]]
+
+    if popular:
+        recipes = Recipe.objects.filter(author_id__in=popular)
+        if after:
+            recipes = recipes.filter(keyset_filter(('pub_date', 'id'), after))
+        sources.append(recipes.order_by('-pub_date', '-id').values_list(
+            'pub_date', 'id'
+        )[:limit])
+
+    keys = list(heapq.merge(*sources, reverse=True))[:limit]
+    recipes = Recipe.objects.with_related().in_bulk(
+        [pk for _, pk in keys]
+    )
+    return [recipes[pk] for _, pk in keys if pk in recipes]
@@ -1,18 +1,12 @@
 from django_filters import ModelMultipleChoiceFilter
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.search import match_ingredients, search_recipes
+from recipes.models import Recipe, Tag
 
 
-class IngredientSearch(filters.FilterSet):
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
-    )
-
-    class Meta:
-        model = Ingredient
-        fields = ('name',)
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class RecipeFilter(filters.FilterSet):
@@ -27,13 +21,21 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_cart'
     )
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+    ingredients = NumberInFilter(
+        method='filter_ingredients'
+    )
 
     class Meta:
         fields = (
             'author',
             'tags',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ingredients'
         )
         model = Recipe
 
@@ -48,3 +50,23 @@ class RecipeFilter(filters.FilterSet):
         if user.is_authenticated and value:
             return queryset.filter(cart__user=self.request.user)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        if value.strip():
+            return search_recipes(queryset, value)
+        return queryset
+
+    def filter_ingredients(self, queryset, name, value):
+        return match_ingredients(queryset, value)
+
+    def filter_queryset(self, queryset):
+        """Ранжирует результаты поиска и подбора по ингредиентам."""
+        queryset = super().filter_queryset(queryset)
+        annotations = queryset.query.annotations
+        ordering = [
+            field for field in ('missing', '-matched', '-rank')
+            if field.lstrip('-') in annotations
+        ]
+        if ordering:
+            queryset = queryset.order_by(*ordering, '-pub_date', '-id')
+        return queryset
@@ -0,0 +1,164 @@
+import binascii
+import os
+import tempfile
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import connection
+from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
+from rest_framework.fields import FileField
+
+from api.versions import bump_version
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+DECODE_CHUNK = 64 * 1024
+SPOOL_SIZE = 1024 * 1024
+ALLOWED_FORMATS = {
+    'JPEG': 'jpg',
+    'PNG': 'png',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+VARIANTS = {
+    'thumbnail': ((480, 480), 'JPEG', 'jpg'),
+    'webp': ((1280, 1280), 'WEBP', 'webp'),
+}
+
+_executor = None
+
+
+class RecipeImageField(Base64ImageField):
+    """Base64ImageField с потоковым декодированием и проверкой размера.
+
+    Строка декодируется кусками во временный файл (в памяти до 1 МБ,
+    дальше на диске), формат проверяется Pillow без полной распаковки.
+    """
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+
+        _, _, base64_data = base64_data.rpartition(';base64,')
+        if len(base64_data) > MAX_IMAGE_SIZE * 4 // 3 + 4:
+            raise ValidationError(
+                f'Размер изображения не должен превышать '
+                f'{MAX_IMAGE_SIZE // (1024 * 1024)} МБ'
+            )
+
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        try:
+            for start in range(0, len(base64_data), DECODE_CHUNK):
+                file.write(binascii.a2b_base64(
+                    base64_data[start:start + DECODE_CHUNK]
+                ))
+            file.seek(0)
+            with Image.open(file) as image:
+                image_format = image.format
+                image.verify()
+        except (binascii.Error, OSError, Image.DecompressionBombError):
+            file.close()
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+
+        extension = ALLOWED_FORMATS.get(image_format)
+        if extension is None:
+            file.close()
+            raise ValidationError(self.INVALID_TYPE_MESSAGE)
+
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        upload = UploadedFile(
+            file=file,
+            name=f'{uuid.uuid4()}.{extension}',
+            content_type=Image.MIME[image_format],
+            size=size,
+        )
+        return FileField.to_internal_value(self, upload)
+
+
+def variant_name(name, variant):
+    path = PurePosixPath(name)
+    extension = VARIANTS[variant][2]
+    return str(path.parent / 'variants' / f'{path.stem}_{variant}.{extension}')
+
+
+def variant_urls(image):
+    """URL вариантов изображения; пока вариант не готов — оригинал."""
+    if not image:
+        return {variant: None for variant in VARIANTS}
+    return stored_variant_urls(image.storage, image.name)
+
+
+def stored_variant_urls(storage, name):
+    """То же по имени файла в хранилище, без объекта FieldFile."""
+    original = storage.url(name)
+    urls = {}
+    for variant in VARIANTS:
+        variant_file = variant_name(name, variant)
+        urls[variant] = (
+            storage.url(variant_file) if storage.exists(variant_file)
+            else original
+        )
+    return urls
+
+
+def make_variants(source, targets):
+    """Создает уменьшенные копии. Выполняется в процессе пула."""
+    with Image.open(source) as image:
+        image.load()
+        for target, (size, image_format, _) in targets:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            variant = image.copy()
+            variant.thumbnail(size)
+            if image_format == 'JPEG' and variant.mode != 'RGB':
+                variant = variant.convert('RGB')
+            variant.save(target, image_format, optimize=True, quality=82)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def bump_from_thread(version):
+    """Сдвиг версии из потока пула: свое соединение с БД закрывается."""
+    try:
+        bump_version(version)
+    finally:
+        connection.close()
+
+
+def schedule_variants(image, version=None):
+    """Ставит генерацию вариантов изображения в фоновый пул процессов.
+
+    По готовности поднимается метка version, чтобы ETag ответов,
+    содержащих ссылки на варианты, сменился.
+    """
+    if not image:
+        return
+    storage = image.storage
+    targets = [
+        (storage.path(name), options)
+        for name, options in (
+            (variant_name(image.name, variant), options)
+            for variant, options in VARIANTS.items()
+        )
+        if not storage.exists(name)
+    ]
+    if not targets:
+        return
+    source = storage.path(image.name)
+    if settings.IMAGE_WORKERS:
+        future = get_executor().submit(make_variants, source, targets)
+        if version:
+            future.add_done_callback(lambda _: bump_from_thread(version))
+    else:
+        make_variants(source, targets)
@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from types import ModuleType
+
+from asgiref.sync import ThreadSensitiveContext
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+from django.urls import include, path
+
+from api.urls import async_urlpatterns, router
+from recipes.models import Recipe
+
+PATHS = ('/api/recipes/', '/api/recipes/{recipe}/', '/api/tags/',
+         '/api/ingredients/?name=абр')
+
+
+class LatencyProbe:
+    """Имитирует сетевую задержку БД и считает одновременные запросы."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(self.latency)
+            return execute(sql, params, many, context)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def install(self, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+def urlconf(name, patterns):
+    module = ModuleType(name)
+    module.urlpatterns = [path('api/', include((patterns, 'api')))]
+    return module
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает, сколько запросов к БД один воркер держит '
+        'одновременно в режимах WSGI (sync) и ASGI (async).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100)
+        parser.add_argument('--concurrency', type=int, default=20,
+                            help='Одновременных клиентов в режиме ASGI.')
+        parser.add_argument('--db-latency', type=float, default=2.0,
+                            help='Задержка каждого SQL-запроса, мс.')
+
+    def paths(self, count):
+        recipe = Recipe.objects.values_list('pk', flat=True).first()
+        return [
+            PATHS[number % len(PATHS)].format(recipe=recipe)
+            for number in range(count)
+        ]
+
+    def run_sync(self, paths):
+        client = Client()
+        patterns = urlconf('sync_urls', router.urls)
+        with override_settings(ROOT_URLCONF=patterns):
+            return sum(client.get(url).status_code >= 400 for url in paths)
+
+    def run_async(self, paths, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(url):
+            async with semaphore, ThreadSensitiveContext():
+                response = await client.get(url)
+            return response.status_code >= 400
+
+        async def main():
+            return sum(await asyncio.gather(*(fetch(url) for url in paths)))
+
+        patterns = urlconf('async_urls', async_urlpatterns)
+        with override_settings(ROOT_URLCONF=patterns):
+            return asyncio.run(main())
+
+    def measure(self, run, *args):
+        probe = LatencyProbe(self.latency)
+        connection_created.connect(probe.install)
+        for connection in connections.all(initialized_only=True):
+            probe.install(connection)
+        start = time.perf_counter()
+        try:
+            errors = run(*args)
+        finally:
+            connection_created.disconnect(probe.install)
+            for connection in connections.all(initialized_only=True):
+                if probe in connection.execute_wrappers:
+                    connection.execute_wrappers.remove(probe)
+        return time.perf_counter() - start, probe.peak, errors
+
+    def handle(self, *args, **options):
+        self.latency = options['db_latency'] / 1000
+        paths = self.paths(options['requests'])
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            results = (
+                ('sync', *self.measure(self.run_sync, paths)),
+                ('async', *self.measure(
+                    self.run_async, paths, options['concurrency']
+                )),
+            )
+        self.stdout.write(
+            f'{"режим":<8}{"время, с":>10}{"req/s":>9}'
+            f'{"SQL одновременно":>18}{"ошибки":>8}'
+        )
+        for mode, elapsed, peak, errors in results:
+            self.stdout.write(
+                f'{mode:<8}{elapsed:>10.2f}{len(paths) / elapsed:>9.0f}'
+                f'{peak:>18}{errors:>8}'
+            )
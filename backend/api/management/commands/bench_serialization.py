@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.readers import RecipeReader, recipe_rows
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+from users.models import FoodgramUser
+
+
+class Command(BaseCommand):
+    help = (
+        'Процессорное время на 100 рецептов: RecipeSerializer с '
+        'JSONRenderer против RecipeReader с FastJSONRenderer.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100,
+                            help='Рецептов в одном ответе.')
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--user', default=None,
+                            help='username, от имени которого строить '
+                                 'is_favorited и is_subscribed.')
+
+    def make_request(self):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        if self.user is not None:
+            request.user = self.user
+        return request
+
+    def serializer(self, ids):
+        request = self.make_request()
+        recipes = Recipe.objects.with_related().filter(pk__in=ids)
+        data = RecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        return JSONRenderer().render(data)
+
+    def reader(self, ids):
+        request = self.make_request()
+        rows = recipe_rows(Recipe.objects.filter(pk__in=ids))
+        return FastJSONRenderer().render(RecipeReader(request).build(rows))
+
+    def measure(self, build, ids, rounds):
+        build(ids)
+        start = time.process_time()
+        for _ in range(rounds):
+            build(ids)
+        return (time.process_time() - start) / rounds
+
+    def handle(self, *args, **options):
+        ids = list(Recipe.objects.values_list('pk', flat=True)[
+            :options['recipes']
+        ])
+        if not ids:
+            raise CommandError('Сначала выполните seed_benchmark.')
+        self.user = None
+        if options['user']:
+            self.user = FoodgramUser.objects.filter(
+                username=options['user']
+            ).first()
+            if self.user is None:
+                raise CommandError(f'Нет пользователя {options["user"]}.')
+
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            if self.serializer(ids) != self.reader(ids):
+                raise CommandError(
+                    'Ответы RecipeSerializer и RecipeReader различаются.'
+                )
+            results = [
+                (name, self.measure(build, ids, options['rounds']))
+                for name, build in (
+                    ('serializer', self.serializer),
+                    ('reader', self.reader),
+                )
+            ]
+
+        scale = 100 / len(ids)
+        self.stdout.write(f'{"путь":<12}{"CPU, мс / 100 рецептов":>24}')
+        for name, seconds in results:
+            self.stdout.write(f'{name:<12}{seconds * 1000 * scale:>24.1f}')
+        self.stdout.write(
+            f'ускорение: {results[0][1] / results[1][1]:.1f}x'
+        )
@@ -0,0 +1,41 @@
+import io
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+from api.cart import TITLE
+from api.pdf import FONT_FILE, FONT_NAME, FONTS_DIR, draw_pages
+
+
+def render_uncached(lines):
+    """Прежнее поведение: шрифт разбирается заново на каждый запрос."""
+    pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONTS_DIR / FONT_FILE)))
+    draw_pages(canvas.Canvas(io.BytesIO()), TITLE, lines)
+
+
+def render_cached(lines):
+    draw_pages(canvas.Canvas(io.BytesIO()), TITLE, lines)
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время генерации PDF списка покупок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=30)
+        parser.add_argument('--runs', type=int, default=200)
+
+    def measure(self, render, lines, runs):
+        start = perf_counter()
+        for _ in range(runs):
+            render(lines)
+        return (perf_counter() - start) / runs * 1000
+
+    def handle(self, *args, **options):
+        lines = [f'Ингредиент {i} - {i} г' for i in range(options['rows'])]
+        for name, render in (('uncached', render_uncached),
+                             ('cached', render_cached)):
+            ms = self.measure(render, lines, options['runs'])
+            self.stdout.write(f'{name}: {ms:.2f} ms/request')
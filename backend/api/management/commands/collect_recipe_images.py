@@ -0,0 +1,80 @@
+import posixpath
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from api.images import VARIANTS, variant_name
+from recipes.models import Recipe
+
+ROOT = 'recipes'
+MIN_AGE = 60 * 60
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет изображения рецептов и их варианты, на которые '
+        'не ссылается ни один рецепт.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--min-age', type=int, default=MIN_AGE,
+            help='Не трогать файлы моложе указанного числа секунд.'
+        )
+
+    def referenced(self):
+        references = Counter(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        )
+        keep = set(references)
+        for name in references:
+            keep.update(variant_name(name, variant) for variant in VARIANTS)
+        return references, keep
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        references, keep = self.referenced()
+
+        if not storage.exists(ROOT):
+            return
+        threshold = time.time() - options['min_age']
+        candidates = [
+            name for name in walk(storage, ROOT)
+            if name not in keep
+            and storage.get_modified_time(name).timestamp() <= threshold
+        ]
+        # Пока шел обход, новый рецепт мог переиспользовать старый файл
+        # с тем же содержимым: ссылки перечитываются перед удалением.
+        references, keep = self.referenced()
+        removed = freed = 0
+        for name in candidates:
+            if name in keep:
+                continue
+            if options['dry_run']:
+                size = storage.size(name)
+            else:
+                # Время изменения проверяется еще раз уже после захвата
+                # файла: save мог переиспользовать его после обхода.
+                size = storage.delete_unused(name, threshold)
+                if size is None:
+                    continue
+            freed += size
+            removed += 1
+
+        shared = sum(1 for count in references.values() if count > 1)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов в использовании: {len(references)} '
+            f'(общих для нескольких рецептов: {shared}). '
+            f'Удалено: {removed}, освобождено {freed / 1024:.0f} КБ'
+            + (' (пробный запуск)' if options['dry_run'] else '')
+        ))
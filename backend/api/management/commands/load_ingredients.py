@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+BATCH_SIZE = 1000
+
+COPY_SQL = (
+    'CREATE TEMP TABLE ingredient_import '
+    '(name varchar(200), measurement_unit varchar(200)) ON COMMIT DROP'
+)
+UPSERT_SQL = (
+    'INSERT INTO {table} (name, measurement_unit) '
+    'SELECT DISTINCT name, measurement_unit FROM ingredient_import '
+    'ON CONFLICT (name, measurement_unit) DO NOTHING'
+)
+
+
+def read_csv(path):
+    with open(path, encoding='utf-8', newline='') as file:
+        for name, measurement_unit in csv.reader(file):
+            yield name, measurement_unit
+
+
+def read_json(path):
+    with open(path, encoding='utf-8') as file:
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = 'Загружает ингредиенты из CSV или JSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=str(DEFAULT_PATH))
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def bulk_create(self, batches):
+        for batch in batches:
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+
+    def copy(self, batches):
+        with connection.cursor() as cursor:
+            cursor.execute(COPY_SQL)
+            for batch in batches:
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            cursor.execute(UPSERT_SQL.format(
+                table=connection.ops.quote_name(Ingredient._meta.db_table)
+            ))
+
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = next(
+            (read for ext, read in READERS.items() if path.endswith(ext)),
+            None
+        )
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
+
+        rows_read = 0
+
+        def counted(rows):
+            nonlocal rows_read
+            for row in rows:
+                rows_read += 1
+                yield row
+
+        before = Ingredient.objects.count()
+        start = perf_counter()
+        chunks = batches(counted(reader(path)), options['batch_size'])
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                self.copy(chunks)
+            else:
+                self.bulk_create(chunks)
+        elapsed = perf_counter() - start
+        created = Ingredient.objects.count() - before
+        ingredient_index.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {rows_read}, добавлено {created} ингредиентов '
+            f'за {elapsed:.2f} с ({rows_read / elapsed:.0f} строк/с)'
+        ))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import FoodgramUser, Subscription
+
+
+def count_of(model, field):
+    """Подзапрос с количеством строк model, ссылающихся на внешний объект."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает денормализованные счетчики рецептов и авторов.'
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.update(
+            favorites_count=count_of(Favorite, 'recipe'),
+            in_cart_count=count_of(Cart, 'recipe'),
+        )
+        users = FoodgramUser.objects.update(
+            recipes_count=count_of(Recipe, 'author'),
+            subscribers_count=count_of(Subscription, 'author'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счетчики: рецептов {recipes}, пользователей {users}'
+        ))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from api.search import SEARCH_BATCH_SIZE, is_postgres, update_search_vector
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает поисковые векторы рецептов пачками.'
+
+    def handle(self, *args, **options):
+        if not is_postgres():
+            self.stdout.write('Поисковые векторы хранятся только в Postgres.')
+            return
+        ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        total = 0
+        batch = []
+        for pk in ids.iterator(chunk_size=SEARCH_BATCH_SIZE):
+            batch.append(pk)
+            if len(batch) == SEARCH_BATCH_SIZE:
+                total += update_search_vector(*batch)
+                batch = []
+        if batch:
+            total += update_search_vector(*batch)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обновлено рецептов: {total}'
+        ))
@@ -0,0 +1,213 @@
+import json
+import random
+import statistics
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.seed_benchmark import PREFIX
+from recipes.models import Ingredient, Recipe
+from users.models import Subscription
+
+SEARCH_WORDS = ('рецепт', 'синтетический', 'номер')
+
+
+class InProcessClient:
+    """Запросы через django.test.Client с подсчетом SQL-запросов."""
+
+    def __init__(self, token):
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+        self.anonymous = Client()
+
+    def request(self, method, path, anonymous=False):
+        client = self.anonymous if anonymous else self.client
+        with CaptureQueriesContext(connection) as queries:
+            start = perf_counter()
+            response = getattr(client, method)(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = perf_counter() - start
+        return response.status_code, elapsed, len(queries)
+
+
+class HttpClient:
+    """Запросы к запущенному серверу (например, локальному gunicorn)."""
+
+    def __init__(self, token, url):
+        import requests
+
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers['Authorization'] = f'Token {token}'
+        self.anonymous = requests.Session()
+
+    def request(self, method, path, anonymous=False):
+        session = self.anonymous if anonymous else self.session
+        start = perf_counter()
+        response = session.request(method.upper(), self.url + path)
+        elapsed = perf_counter() - start
+        return response.status_code, elapsed, None
+
+
+def percentile(samples, percent):
+    if len(samples) < 2:
+        return samples[0]
+    return statistics.quantiles(samples, n=100)[percent - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные эндпоинты API и печатает p50/p95/p99, '
+        'запросов в секунду и SQL-запросов на запрос. Данные готовит '
+        'seed_benchmark.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Измеряемых запросов на сценарий.')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--url',
+                            help='Адрес сервера; по умолчанию in-process.')
+        parser.add_argument('--scenario', action='append',
+                            help='Запустить только указанные сценарии.')
+        parser.add_argument('--json', help='Сохранить отчет в файл.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def scenarios(self, rng, user_id):
+        recipes = list(Recipe.objects.filter(
+            author__username__startswith=PREFIX
+        ).values_list('pk', flat=True))
+        not_favorited = list(Recipe.objects.filter(
+            author__username__startswith=PREFIX
+        ).exclude(favorite__user_id=user_id).values_list('pk', flat=True))
+        prefixes = [
+            name[:3] for name in Ingredient.objects.values_list(
+                'name', flat=True
+            )[:500]
+        ]
+        if not recipes or not prefixes:
+            raise CommandError('Сначала выполните seed_benchmark.')
+
+        def toggle():
+            pk = rng.choice(not_favorited)
+            return [('post', f'/api/recipes/{pk}/favorite/'),
+                    ('delete', f'/api/recipes/{pk}/favorite/')]
+
+        return {
+            'recipes_list_anonymous': lambda: [(
+                'get', f'/api/recipes/?page={rng.randint(1, 20)}', True
+            )],
+            'recipes_list': lambda: [(
+                'get', f'/api/recipes/?page={rng.randint(1, 20)}'
+            )],
+            'recipes_list_tags': lambda: [(
+                'get', '/api/recipes/?tags=breakfast&tags=dinner'
+            )],
+            'recipes_list_favorited': lambda: [(
+                'get', '/api/recipes/?is_favorited=1'
+            )],
+            'recipes_cursor': lambda: [('get', '/api/recipes/?cursor=')],
+            'recipes_search': lambda: [(
+                'get', f'/api/recipes/?search={rng.choice(SEARCH_WORDS)}'
+            )],
+            'recipe_retrieve': lambda: [(
+                'get', f'/api/recipes/{rng.choice(recipes)}/'
+            )],
+            'ingredients_search': lambda: [(
+                'get', f'/api/ingredients/?name={rng.choice(prefixes)}'
+            )],
+            'subscriptions': lambda: [(
+                'get', '/api/users/subscriptions/?recipes_limit=3'
+            )],
+            'feed': lambda: [('get', '/api/recipes/feed/')],
+            'download_shopping_cart_pdf': lambda: [(
+                'get', '/api/recipes/download_shopping_cart/'
+            )],
+            'download_shopping_cart_txt': lambda: [(
+                'get', '/api/recipes/download_shopping_cart/?format=txt'
+            )],
+            'favorite_toggle': toggle,
+        }
+
+    def bench_user(self):
+        busiest = Subscription.objects.filter(
+            user__username__startswith=PREFIX
+        ).values('user').annotate(total=Count('pk')).order_by(
+            '-total'
+        ).first()
+        if busiest is None:
+            raise CommandError('Сначала выполните seed_benchmark.')
+        return busiest['user']
+
+    def run(self, client, steps, count):
+        timings, queries, errors = [], [], 0
+        for _ in range(count):
+            for method, path, *anonymous in steps():
+                status, elapsed, query_count = client.request(
+                    method, path, *anonymous
+                )
+                errors += status >= 400
+                timings.append(elapsed)
+                if query_count is not None:
+                    queries.append(query_count)
+        return timings, queries, errors
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        user_id = self.bench_user()
+        token, _ = Token.objects.get_or_create(user_id=user_id)
+        scenarios = self.scenarios(rng, user_id)
+        selected = options['scenario'] or list(scenarios)
+        unknown = set(selected) - scenarios.keys()
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {sorted(unknown)}')
+
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']
+        ):
+            client = (
+                HttpClient(token.key, options['url']) if options['url']
+                else InProcessClient(token.key)
+            )
+            report = {}
+            for name in selected:
+                self.run(client, scenarios[name], options['warmup'])
+                timings, queries, errors = self.run(
+                    client, scenarios[name], options['requests']
+                )
+                report[name] = {
+                    'requests': len(timings),
+                    'errors': errors,
+                    'p50_ms': percentile(timings, 50) * 1000,
+                    'p95_ms': percentile(timings, 95) * 1000,
+                    'p99_ms': percentile(timings, 99) * 1000,
+                    'rps': len(timings) / sum(timings),
+                    'queries': (
+                        statistics.mean(queries) if queries else None
+                    ),
+                }
+        self.print_report(report)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def print_report(self, report):
+        self.stdout.write(
+            f'{"сценарий":<28}{"p50":>9}{"p95":>9}{"p99":>9}'
+            f'{"req/s":>9}{"SQL":>7}{"ошибки":>8}'
+        )
+        for name, row in report.items():
+            queries = (
+                '-' if row['queries'] is None else f'{row["queries"]:.1f}'
+            )
+            self.stdout.write(
+                f'{name:<28}{row["p50_ms"]:>9.2f}{row["p95_ms"]:>9.2f}'
+                f'{row["p99_ms"]:>9.2f}{row["rps"]:>9.0f}{queries:>7}'
+                f'{row["errors"]:>8}'
+            )
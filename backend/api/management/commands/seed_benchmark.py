@@ -0,0 +1,192 @@
+import base64
+import random
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from users.models import FoodgramUser, Subscription
+
+PREFIX = 'bench_'
+PASSWORD = 'bench-password'
+SKEW = 1.1
+BATCH_SIZE = 1000
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+IMAGE = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8'
+    '/5+hHgAHggJ/PchI7wAAAABJRU5ErkJggg=='
+)
+
+
+def zipf_weights(size):
+    """Веса «популярности»: первые элементы выбираются намного чаще."""
+    return [1 / (rank + 1) ** SKEW for rank in range(size)]
+
+
+def sample(rng, population, weights, size):
+    """До size разных элементов с учетом весов."""
+    size = min(size, len(population))
+    picked = set()
+    while len(picked) < size:
+        picked.update(rng.choices(population, weights, k=size - len(picked)))
+    return picked
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, рецептами, '
+        'избранным, корзинами и подписками для бенчмарков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Среднее число избранных на пользователя.')
+        parser.add_argument('--cart', type=int, default=5,
+                            help='Среднее число рецептов в корзине.')
+        parser.add_argument('--subscriptions', type=int, default=10,
+                            help='Среднее число подписок на пользователя.')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--clear', action='store_true',
+                            help='Удалить данные прошлого запуска.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        start = perf_counter()
+        if options['clear']:
+            FoodgramUser.objects.filter(username__startswith=PREFIX).delete()
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', stdout=self.stdout)
+
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            tags = self.create_tags()
+            recipes = self.create_recipes(rng, users, tags, options['recipes'])
+            self.create_relations(rng, users, recipes, options)
+
+        call_command('rebuild_counters', stdout=self.stdout)
+        call_command('rebuild_search', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, рецептов: {len(recipes)} '
+            f'за {perf_counter() - start:.1f} с'
+        ))
+
+    def create_users(self, count):
+        password = make_password(PASSWORD)
+        start = FoodgramUser.objects.filter(
+            username__startswith=PREFIX
+        ).count()
+        FoodgramUser.objects.bulk_create(
+            [
+                FoodgramUser(
+                    username=f'{PREFIX}{number}',
+                    email=f'{PREFIX}{number}@example.com',
+                    first_name='Бенч',
+                    last_name=str(number),
+                    password=password
+                )
+                for number in range(start, start + count)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        return list(FoodgramUser.objects.filter(
+            username__startswith=PREFIX
+        ).order_by('pk').values_list('pk', flat=True))
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={'name': name, 'color': color}
+            )
+        return list(Tag.objects.values_list('pk', flat=True))
+
+    def create_recipes(self, rng, users, tags, count):
+        image = Recipe._meta.get_field('image')
+        image_name = image.storage.save(
+            image.upload_to + 'bench.png', ContentFile(IMAGE)
+        )
+        ingredients = list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        rng.shuffle(ingredients)
+        ingredient_weights = zipf_weights(len(ingredients))
+        authors = rng.choices(users, zipf_weights(len(users)), k=count)
+
+        created = Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    text=f'Синтетический рецепт номер {number}.',
+                    cooking_time=rng.randint(5, 180),
+                    image=image_name
+                )
+                for number, author_id in enumerate(authors)
+            ],
+            batch_size=BATCH_SIZE
+        )
+        recipes = [recipe.pk for recipe in created]
+        if recipes[0] is None:
+            recipes = list(Recipe.objects.order_by('-pk').values_list(
+                'pk', flat=True
+            )[:count])
+
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe_id in recipes
+                for ingredient_id in sample(
+                    rng, ingredients, ingredient_weights, rng.randint(3, 10)
+                )
+            ],
+            batch_size=BATCH_SIZE
+        )
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            [
+                RecipeTag(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id in recipes
+                for tag_id in rng.sample(tags, rng.randint(1, len(tags)))
+            ],
+            batch_size=BATCH_SIZE
+        )
+        return recipes
+
+    def create_relations(self, rng, users, recipes, options):
+        recipe_weights = zipf_weights(len(recipes))
+        user_weights = zipf_weights(len(users))
+        for model, field, population, weights, mean in (
+            (Favorite, 'recipe_id', recipes, recipe_weights,
+             options['favorites']),
+            (Cart, 'recipe_id', recipes, recipe_weights, options['cart']),
+            (Subscription, 'author_id', users, user_weights,
+             options['subscriptions']),
+        ):
+            model.objects.bulk_create(
+                [
+                    model(user_id=user_id, **{field: target_id})
+                    for user_id in users
+                    for target_id in sample(
+                        rng, population, weights,
+                        round(rng.expovariate(1 / mean)) if mean else 0
+                    )
+                    if target_id != user_id or model is not Subscription
+                ],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True
+            )
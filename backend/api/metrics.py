@@ -0,0 +1,225 @@
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+
+from api.dbstats import pool_stats
+
+logger = logging.getLogger('foodgram.queries')
+
+METRICS_VIEW_NAME = 'api:metrics'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+METRICS = (
+    ('requests_total', 'counter', 'Число запросов'),
+    ('queries_total', 'counter', 'Число SQL-запросов'),
+    ('db_seconds_total', 'counter', 'Время в БД, с'),
+    ('render_seconds_total', 'counter',
+     'Время рендеринга ответа DRF в байты (без сериализаторов), с'),
+    ('response_bytes_total', 'counter', 'Размер ответов, байт'),
+    ('query_budget_exceeded_total', 'counter',
+     'Запросы, превысившие бюджет SQL-запросов'),
+    ('queries_max', 'gauge', 'Максимум SQL-запросов за один запрос'),
+)
+
+
+class QueryRecorder:
+    """Счетчик запросов и времени в БД для одного HTTP-запроса."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+current_recorder = contextvars.ContextVar('query_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """execute_wrapper всех соединений: пишет в recorder текущего запроса.
+
+    Соединения Django привязаны к потоку, а под ASGI запросы к БД идут
+    из потоков sync_to_async, поэтому recorder передается через
+    ContextVar, а не регистрируется на соединении в middleware.
+    """
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.seconds += time.perf_counter() - start
+        recorder.count += 1
+
+
+def install_wrapper(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@receiver(connection_created)
+def connection_opened(connection, **kwargs):
+    install_wrapper(connection)
+
+
+class EndpointMetrics:
+    """Накопленные метрики по эндпоинтам в памяти воркера."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(lambda: defaultdict(float))
+
+    def record(self, endpoint, queries, db_seconds, render_seconds,
+               response_bytes, over_budget):
+        with self._lock:
+            values = self._values[endpoint]
+            values['requests_total'] += 1
+            values['queries_total'] += queries
+            values['db_seconds_total'] += db_seconds
+            values['render_seconds_total'] += render_seconds
+            values['response_bytes_total'] += response_bytes
+            values['query_budget_exceeded_total'] += over_budget
+            values['queries_max'] = max(values['queries_max'], queries)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                endpoint: dict(values)
+                for endpoint, values in self._values.items()
+            }
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, kind, description in METRICS:
+            lines.append(f'# HELP foodgram_{name} {description}')
+            lines.append(f'# TYPE foodgram_{name} {kind}')
+            for endpoint, values in sorted(snapshot.items()):
+                lines.append(
+                    f'foodgram_{name}{{endpoint="{endpoint}"}} '
+                    f'{values.get(name, 0):g}'
+                )
+        lines.append('# HELP foodgram_db_connections_opened_total '
+                     'Открытые воркером соединения с БД')
+        lines.append('# TYPE foodgram_db_connections_opened_total counter')
+        for alias, stats in pool_stats()['databases'].items():
+            lines.append(
+                f'foodgram_db_connections_opened_total{{alias="{alias}"}} '
+                f'{stats["opened"]}'
+            )
+        return '\n'.join(lines) + '\n'
+
+
+endpoint_metrics = EndpointMetrics()
+
+
+def endpoint_name(request, response):
+    """ViewSet.action для DRF, иначе имя URL-шаблона."""
+    if getattr(response, 'endpoint', None):
+        return response.endpoint
+    view = getattr(response, 'renderer_context', {}).get('view')
+    if view is not None and getattr(view, 'action', None):
+        return f'{view.__class__.__name__}.{view.action}'
+    match = request.resolver_match
+    return match.view_name if match else 'unresolved'
+
+
+def query_budget(endpoint):
+    return settings.QUERY_BUDGETS.get(endpoint, settings.QUERY_BUDGET)
+
+
+class QueryBudgetMiddleware:
+    """Считает SQL-запросы, время БД и рендеринга, размер ответа.
+
+    Если эндпоинт выполнил больше запросов, чем QUERY_BUDGETS (или
+    QUERY_BUDGET по умолчанию), в лог foodgram.queries пишется
+    предупреждение.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder, token = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder, token = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        return self.finish(request, response, recorder)
+
+    def start(self, request):
+        for connection in connections.all(initialized_only=True):
+            install_wrapper(connection)
+        recorder = QueryRecorder()
+        request._render_started = None
+        request._render_seconds = 0.0
+        return recorder, current_recorder.set(recorder)
+
+    def finish(self, request, response, recorder):
+        match = request.resolver_match
+        if match and match.view_name == METRICS_VIEW_NAME:
+            return response
+
+        endpoint = endpoint_name(request, response)
+        budget = query_budget(endpoint)
+        over_budget = recorder.count > budget
+        if over_budget:
+            logger.warning(
+                '%s %s: %d SQL-запросов при бюджете %d (%.1f мс в БД)',
+                request.method, endpoint, recorder.count, budget,
+                recorder.seconds * 1000
+            )
+        endpoint_metrics.record(
+            endpoint,
+            recorder.count,
+            recorder.seconds,
+            request._render_seconds,
+            0 if response.streaming else len(response.content),
+            over_budget
+        )
+        return response
+
+    def process_template_response(self, request, response):
+        request._render_started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = (
+                time.perf_counter() - request._render_started
+            )
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def metrics_view(request):
+    """Метрики для Prometheus, доступны с INTERNAL_IPS и персоналу."""
+    user = getattr(request, 'user', None)
+    if (request.META.get('REMOTE_ADDR') not in settings.INTERNAL_IPS
+            and not (user and user.is_staff)):
+        raise Http404
+    return HttpResponse(
+        endpoint_metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE
+    )
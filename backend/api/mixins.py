@@ -0,0 +1,122 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from api.response_cache import (cache_key, get_cached_response,
+                                store_response)
+from api.versions import get_versions
+from foodgram.db import use_replica
+
+
+def version_etag(request, names):
+    """ETag, Last-Modified и сами метки версий names.
+
+    Метки запоминаются в request.versions, чтобы обработчик запроса
+    не читал их из БД второй раз.
+    """
+    if request.user.is_authenticated:
+        names = (*names, f'relations:{request.user.pk}')
+    versions = get_versions(*names)
+    request.versions = dict(zip(names, versions))
+    etag = quote_etag(hashlib.md5(
+        repr((request.user.pk, versions)).encode()
+    ).hexdigest())
+    return etag, int(max(versions)), versions
+
+
+def patch_cache_headers(request, response, etag, last_modified, max_age):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    if request.user.is_authenticated:
+        patch_cache_control(
+            response, private=True, max_age=0, must_revalidate=True
+        )
+    else:
+        patch_cache_control(response, public=True, max_age=max_age)
+    response['Vary'] = 'Authorization'
+
+
+class ConditionalGetMixin:
+    """ETag/Last-Modified для list и retrieve по меткам версий.
+
+    Наследник возвращает из get_version_names() имена версий, от которых
+    зависит ответ. Если клиент прислал совпадающий If-None-Match или
+    If-Modified-Since, отдается 304 без обращения к сериализатору.
+    Действия из anonymous_cache_actions для анонимов отдаются из
+    серверного кэша ответов, ключ которого включает те же версии.
+    Если какая-то из версий сдвинута недавно (REPLICA_MAX_LAG), ответ
+    строится по основной БД, а не по реплике.
+    """
+    cache_max_age = 0
+    conditional_actions = ('list', 'retrieve')
+    anonymous_cache_actions = ()
+
+    def get_version_names(self):
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+    def conditional(self, handler, request, *args, **kwargs):
+        if self.action not in self.conditional_actions:
+            return handler(request, *args, **kwargs)
+        etag, last_modified, versions = version_etag(
+            request, self.get_version_names()
+        )
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            # Реплика могла не догнать свежий сдвиг: тело по старым данным
+            # легло бы в кэш и под ETag по новой метке.
+            token = None
+            if time.time() - max(versions) < settings.REPLICA_MAX_LAG:
+                token = use_replica.set(False)
+            try:
+                response = self.cached(
+                    handler, versions, request, *args, **kwargs
+                )
+            finally:
+                if token is not None:
+                    use_replica.reset(token)
+        if response.status_code in (200, 304):
+            patch_cache_headers(
+                request, response, etag, last_modified, self.cache_max_age
+            )
+        return response
+
+    def cached(self, handler, versions, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or self.action not in self.anonymous_cache_actions):
+            return handler(request, *args, **kwargs)
+        key = cache_key(request, request.accepted_media_type, versions)
+        response = get_cached_response(key)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            response.add_post_render_callback(
+                lambda rendered: store_response(key, rendered)
+            )
+        return response
+
+
+class ReplicaReadMixin:
+    """Чтение list/retrieve с реплики, если она настроена в DATABASES."""
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        if self.action in self.replica_actions:
+            self._replica_token = use_replica.set(True)
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            use_replica.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,27 @@
+from django.db import models
+
+MAX_LENGTH_NAME = 64
+
+
+class Version(models.Model):
+    """Метка версии (unix time последнего изменения) по имени.
+
+    Источник правды для api.versions: одна строка на имя, общая
+    для всех воркеров, в отличие от кэша в памяти процесса.
+    """
+
+    name = models.CharField(
+        verbose_name='Имя',
+        max_length=MAX_LENGTH_NAME,
+        primary_key=True
+    )
+    stamp = models.FloatField(
+        verbose_name='Метка'
+    )
+
+    class Meta:
+        verbose_name = 'Версия'
+        verbose_name_plural = 'Версии'
+
+    def __str__(self):
+        return f'{self.name}: {self.stamp}'
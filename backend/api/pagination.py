@@ -1,6 +1,153 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def cursor_id(value):
+    """id из курсора: только целое число, строки и bool не принимаются."""
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise TypeError(value)
+    return value
+
+
+def keyset_filter(fields, values):
+    """Условие «строго после values» при сортировке fields по убыванию."""
+    condition = Q()
+    for index, field in enumerate(fields):
+        condition |= Q(
+            **dict(zip(fields[:index], values[:index])),
+            **{f'{field}__lt': values[index]}
+        )
+    return condition
 
 
 class LimitNumberPagination(PageNumberPagination):
+    """Постраничная пагинация с ?limit= и опциональным режимом ?cursor=.
+
+    Если в наследнике задан cursor_ordering, запрос с параметром cursor
+    пагинируется по ключу (keyset) в порядке убывания этих полей:
+    без COUNT(*) и OFFSET, так что любая страница стоит как первая.
+    Выборки с другой сортировкой (например, по релевантности) всегда
+    пагинируются по номеру страницы.
+    """
     page_size_query_param = 'limit'
     page_size = 6
+    cursor_query_param = 'cursor'
+    cursor_ordering = None
+    # Разбор значений курсора, по одному на поле cursor_ordering;
+    # None или исключение означает неверный курсор.
+    cursor_parsers = (parse_datetime, cursor_id)
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.uses_keyset(queryset, request)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params[self.cursor_query_param]
+        if cursor:
+            queryset = queryset.filter(
+                keyset_filter(self.cursor_ordering, self.decode_cursor(cursor))
+            )
+        page = list(queryset.order_by(
+            *(f'-{field}' for field in self.cursor_ordering)
+        )[:page_size + 1])
+        return self.cut_page(page, page_size)
+
+    def uses_keyset(self, queryset, request):
+        return bool(
+            self.cursor_ordering
+            and self.cursor_query_param in request.query_params
+            and tuple(queryset.query.order_by) in (
+                (), tuple(f'-{field}' for field in self.cursor_ordering)
+            )
+        )
+
+    def cut_page(self, page, page_size):
+        """Отрезает лишнюю строку, по которой узнали о следующей странице."""
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1])
+        return page
+
+    def encode_cursor(self, obj):
+        values = []
+        for field in self.cursor_ordering:
+            if isinstance(obj, dict):
+                value = obj[field]
+            else:
+                value = getattr(obj, field)
+            values.append(
+                value.isoformat() if hasattr(value, 'isoformat') else value
+            )
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(values, list)
+                or len(values) != len(self.cursor_ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                parse(value)
+                for parse, value in zip(self.cursor_parsers, values)
+            ]
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+class RecipePagination(LimitNumberPagination):
+    cursor_ordering = ('pub_date', 'id')
+
+
+class SubscriptionPagination(LimitNumberPagination):
+    cursor_ordering = ('date_added', 'id')
+
+
+class FeedPagination(LimitNumberPagination):
+    """Ленту всегда отдает по ключу, номера страниц не поддерживаются."""
+    cursor_ordering = ('pub_date', 'id')
+
+    def paginate_feed(self, request, feed):
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = request.query_params.get(self.cursor_query_param)
+        after = self.decode_cursor(cursor) if cursor else None
+        return self.cut_page(feed(after, page_size + 1), page_size)
@@ -0,0 +1,63 @@
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+FONTS_DIR = settings.BASE_DIR / 'fonts'
+FONT_NAME = 'Manrope'
+FONT_FILE = 'Manrope-Regular.ttf'
+
+TITLE_FONT_SIZE = 18
+ROW_FONT_SIZE = 12
+PAGE_WIDTH, PAGE_HEIGHT = A4
+TITLE_Y = 800
+PAGE_TOP = 750
+PAGE_BOTTOM = 50
+LINE_HEIGHT = 20
+MARGIN_LEFT = 50
+
+HEADER_FORM = 'header'
+
+_title_x = {}
+
+
+def register_fonts():
+    """Регистрирует шрифты из backend/fonts один раз на процесс."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONTS_DIR / FONT_FILE)))
+
+
+def title_x(title):
+    """Горизонтальная позиция заголовка, вычисляется один раз."""
+    if title not in _title_x:
+        width = pdfmetrics.stringWidth(title, FONT_NAME, TITLE_FONT_SIZE)
+        _title_x[title] = (PAGE_WIDTH - width) / 2
+    return _title_x[title]
+
+
+def draw_pages(p, title, lines):
+    """Рисует строки постранично, повторяя заголовок на каждой странице.
+
+    Заголовок записывается в документ один раз как form XObject,
+    страницы только ссылаются на него.
+    """
+    register_fonts()
+    p.beginForm(HEADER_FORM)
+    p.setFont(FONT_NAME, TITLE_FONT_SIZE)
+    p.drawString(title_x(title), TITLE_Y, title)
+    p.endForm()
+
+    def new_page():
+        p.doForm(HEADER_FORM)
+        p.setFont(FONT_NAME, ROW_FONT_SIZE)
+        return PAGE_TOP
+
+    y = new_page()
+    for line in lines:
+        if y < PAGE_BOTTOM:
+            p.showPage()
+            y = new_page()
+        p.drawString(MARGIN_LEFT, y, line)
+        y -= LINE_HEIGHT
+    p.showPage()
+    p.save()
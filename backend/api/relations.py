@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+from api.versions import bump_version, get_version
+from recipes.models import Cart, Favorite
+from users.models import Subscription
+
+CACHE_KEY = 'user_relations:{}:{}'
+CACHE_TIMEOUT = 300
+
+
+class UserRelations:
+    """Множества id избранного, корзины и подписок пользователя.
+
+    Загружаются один раз на запрос (или берутся из кэша Django),
+    после чего флаги is_favorited, is_in_shopping_cart и is_subscribed
+    вычисляются проверкой вхождения в множество. Ключ кэша включает
+    версию relations:<id>, поэтому запись пользователя в любом воркере
+    делает закэшированные множества невидимыми для всех. Читаются всегда
+    с основной БД: с отстающей реплики в кэш попала бы картина до
+    только что сделанной пользователем записи.
+    """
+    __slots__ = ('favorites', 'cart', 'subscriptions')
+
+    def __init__(self, favorites=(), cart=(), subscriptions=()):
+        self.favorites = frozenset(favorites)
+        self.cart = frozenset(cart)
+        self.subscriptions = frozenset(subscriptions)
+
+    @classmethod
+    def load(cls, user, version=None):
+        if version is None:
+            version = get_version(f'relations:{user.pk}')
+        key = CACHE_KEY.format(user.pk, version)
+        data = cache.get(key)
+        if data is None:
+            data = (
+                list(Favorite.objects.using(DEFAULT_DB_ALIAS)
+                     .filter(user=user).values_list('recipe_id', flat=True)),
+                list(Cart.objects.using(DEFAULT_DB_ALIAS)
+                     .filter(user=user).values_list('recipe_id', flat=True)),
+                list(Subscription.objects.using(DEFAULT_DB_ALIAS)
+                     .filter(user=user).values_list('author_id', flat=True)),
+            )
+            cache.set(key, data, CACHE_TIMEOUT)
+        return cls(*data)
+
+
+def get_relations(request):
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        user = request.user
+        relations = UserRelations()
+        if user.is_authenticated:
+            # Метку уже мог прочитать version_etag этого запроса.
+            relations = UserRelations.load(
+                user,
+                getattr(request, 'versions', {}).get(f'relations:{user.pk}')
+            )
+        request._user_relations = relations
+    return relations
+
+
+def invalidate_relations(request):
+    bump_version(f'relations:{request.user.pk}')
+    request._user_relations = None
+    getattr(request, 'versions', {}).pop(f'relations:{request.user.pk}', None)
@@ -0,0 +1,57 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+CACHE_KEY = 'anon_response:{}'
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def normalized_query(request):
+    """Параметры запроса в порядке сортировки: ?b=1&a=2 и ?a=2&b=1
+    попадают в одну запись кэша.
+    """
+    return urlencode(sorted(
+        (key, value)
+        for key, values in request.GET.lists()
+        for value in values
+    ))
+
+
+def cache_key(request, media_type, versions):
+    """Ключ ответа для анонимов; версии в ключе — счетчики поколений.
+
+    При изменении рецепта, тэга или ингредиента сдвигаются их версии
+    (api.signals), и старые записи просто перестают читаться и
+    истекают по таймауту: удалять или перебирать ключи не нужно.
+    Схема и хост тоже в ключе: в ответах абсолютные URL изображений
+    и страниц.
+    """
+    return CACHE_KEY.format(hashlib.md5(repr((
+        request.scheme, request.get_host(), request.path,
+        normalized_query(request), media_type, versions
+    )).encode()).hexdigest())
+
+
+def get_cached_response(key):
+    entry = response_cache().get(key)
+    if entry is None:
+        return None
+    content, content_type = entry
+    response = HttpResponse(content, content_type=content_type)
+    response['X-Response-Cache'] = 'hit'
+    return response
+
+
+def store_response(key, response):
+    if response.status_code == 200 and not response.streaming:
+        response_cache().set(
+            key,
+            (response.content, response['Content-Type']),
+            settings.RESPONSE_CACHE_TIMEOUT
+        )
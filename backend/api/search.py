@@ -0,0 +1,92 @@
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import (Case, Count, Exists, F, IntegerField, OuterRef,
+                              Q, Subquery, TextField, Value, When)
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, RecipeIngredient
+
+SEARCH_CONFIG = 'russian'
+SEARCH_BATCH_SIZE = 1000
+
+
+def is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def update_search_vector(*recipe_ids):
+    """Пересчитывает поисковый вектор: название (A), ингредиенты (B),
+    текст (C). Вне Postgres вектор не хранится, поиск идет по LIKE.
+    """
+    if not is_postgres():
+        return
+    names = RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', ' ')
+    ).values('names')
+    queryset = Recipe.objects.all()
+    if recipe_ids:
+        queryset = queryset.filter(pk__in=recipe_ids)
+    return queryset.update(search_vector=(
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(Subquery(names), Value(''), output_field=TextField()),
+            weight='B',
+            config=SEARCH_CONFIG
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_recipes(queryset, text):
+    """Оставляет рецепты, подходящие под запрос, с релевантностью rank."""
+    if is_postgres():
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        )
+
+    condition = Q()
+    rank = Value(0)
+    for term in text.split():
+        in_name = Q(name__icontains=term)
+        in_text = Q(text__icontains=term)
+        in_ingredients = Exists(RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk'), ingredient__name__icontains=term
+        ))
+        condition &= in_name | in_text | in_ingredients
+        rank = rank + sum(
+            Case(When(match, then=weight), default=0,
+                 output_field=IntegerField())
+            for match, weight in ((in_name, 4), (in_ingredients, 2),
+                                  (in_text, 1))
+        )
+    return queryset.filter(condition).annotate(rank=rank)
+
+
+def match_ingredients(queryset, ingredient_ids):
+    """Рецепты хотя бы с одним из ингредиентов.
+
+    matched — сколько ингредиентов рецепта есть в списке, missing —
+    сколько придется докупить; готовить можно рецепты с missing = 0.
+    """
+    def count(**filters):
+        return Coalesce(Subquery(
+            RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), **filters
+            ).order_by().values('recipe').annotate(
+                total=Count('pk')
+            ).values('total')
+        ), 0)
+
+    return queryset.filter(Exists(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk'), ingredient_id__in=ingredient_ids
+    ))).annotate(
+        matched=count(ingredient_id__in=ingredient_ids),
+        missing=count() - F('matched')
+    )
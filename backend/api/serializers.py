@@ -1,25 +1,53 @@
 from django.core.validators import EmailValidator, MinLengthValidator
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredient, Tag)
+from api.feed import fan_out
+from api.images import RecipeImageField, schedule_variants, variant_urls
+from api.relations import get_relations
+from api.search import update_search_vector
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import FoodgramUser, Subscription
 
 MIN_PASSWORD_LENGTH = 8
+MAX_BULK_RECIPES = 100
 
 
 def get_sub_info(self, obj):
     """Функция поиска наличия/отсутсвия подписки."""
-    user = self.context['request'].user
-    if user.is_authenticated:
-        return Subscription.objects.filter(
-            user=user, author=obj
-        ).exists()
-    return False
+    return obj.pk in get_relations(self.context['request']).subscriptions
+
+
+def recipes_limit(request):
+    """Значение ?recipes_limit=, None если не задано или некорректно."""
+    try:
+        limit = int(request.query_params['recipes_limit'])
+    except (KeyError, ValueError):
+        return None
+    return max(limit, 0)
+
+
+def recipes_by_author(request, author_ids):
+    """Рецепты для карточек подписок, сгруппированные по автору."""
+    recipes = {author_id: [] for author_id in author_ids}
+    for recipe in Recipe.objects.only(
+        'id', 'author_id', 'name', 'image', 'cooking_time', 'pub_date'
+    ).latest_by_author(author_ids, recipes_limit(request)):
+        recipes[recipe.author_id].append(recipe)
+    return recipes
+
+
+def absolute_urls(request, image):
+    """URL вариантов изображения в том же виде, что и поле image."""
+    urls = variant_urls(image)
+    if request is None:
+        return urls
+    return {
+        variant: url and request.build_absolute_uri(url)
+        for variant, url in urls.items()
+    }
 
 
 class UserInfoSerializer(UserSerializer):
@@ -122,7 +150,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class RecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
     tags = TagSerializer(
         many=True,
         read_only=True
@@ -137,6 +165,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         fields = (
@@ -148,89 +177,46 @@ class RecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time',
         )
         model = Recipe
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        return (
-            user.is_authenticated
-            and Favorite.objects.filter(
-                recipe=obj,
-                user=user
-            ).exists()
-        )
+        return obj.pk in get_relations(self.context['request']).favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        user = request.user
-        return (
-            user.is_anonymous
-            or Cart.objects.filter(
-                recipe=obj,
-                user=user
-            ).exists()
-        )
+        return obj.pk in get_relations(self.context['request']).cart
+
+    def get_image_variants(self, obj):
+        return absolute_urls(self.context.get('request'), obj.image)
 
 
 class RecipeIntroSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         fields = (
             'id',
             'name',
             'image',
+            'image_variants',
             'cooking_time'
         )
         model = Recipe
 
+    def get_image_variants(self, obj):
+        return absolute_urls(self.context.get('request'), obj.image)
 
-class FavoritesSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        fields = (
-            'user',
-            'recipe'
-        )
-        model = Favorite
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже есть в избранном',
-            )
-        ]
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return RecipeIntroSerializer(instance.recipe, context=context).data
-
-
-class CartSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        fields = (
-            'user',
-            'recipe'
-        )
-        model = Cart
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Cart.objects.all(),
-                fields=('user', 'recipe'),
-                message='Рецепт уже есть в корзине'
-            )
-        ]
 
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        return RecipeIntroSerializer(instance.recipe, context=context).data
+class RecipeIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES
+    )
 
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
@@ -256,7 +242,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         queryset=Tag.objects.all()
     )
     ingredients = RecipeIngredientCreateSerializer(many=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         fields = ('id',
@@ -274,11 +260,11 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ingredients = data.get('ingredients')
         cooking_time = data.get('cooking_time')
 
-        if not tags:
+        if not tags and (not self.partial or 'tags' in data):
             raise serializers.ValidationError('Укажите тэг')
-        if not ingredients:
+        if not ingredients and (not self.partial or 'ingredients' in data):
             raise serializers.ValidationError('Укажите ингридиенты')
-        if cooking_time < 1:
+        if cooking_time is not None and cooking_time < 1:
             raise serializers.ValidationError(
                 'Время приготовления не может быть меньше 1 минуты'
             )
@@ -286,7 +272,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         unique_ingredients = set()
         duplicate_ingredients = []
 
-        for ingredient in ingredients:
+        for ingredient in ingredients or ():
             if ingredient['id'] in unique_ingredients:
                 duplicate_ingredients.append(ingredient['id'])
             else:
@@ -313,6 +299,34 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             )
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    def update_ingredients(self, recipe, ingredients):
+        """Применяет к ингредиентам рецепта только разницу с текущими."""
+        current = {
+            item.ingredient_id: item
+            for item in recipe.recipeingredient_set.all()
+        }
+        submitted = {item['id']: item['amount'] for item in ingredients}
+
+        removed = current.keys() - submitted.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, item in current.items():
+            amount = submitted.get(ingredient_id)
+            if amount is not None and amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        added = [
+            {'id': ingredient_id, 'amount': submitted[ingredient_id]}
+            for ingredient_id in submitted.keys() - current.keys()
+        ]
+        if added:
+            self.create_ingredients(recipe, added)
+
     @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
@@ -320,28 +334,43 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.create_ingredients(recipe, ingredients)
+        transaction.on_commit(lambda: schedule_variants(
+            recipe.image, f'recipe:{recipe.pk}'
+        ))
+        transaction.on_commit(lambda: fan_out(recipe))
+        transaction.on_commit(lambda: update_search_vector(recipe.pk))
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
         instance = super().update(instance, validated_data)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        self.create_ingredients(instance, ingredients)
-        instance.tags.set(tags, clear=True)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+        if tags is not None:
+            instance.tags.set(tags)
+        if 'image' in validated_data:
+            transaction.on_commit(lambda: schedule_variants(
+                instance.image, f'recipe:{instance.pk}'
+            ))
+        if {'name', 'text'} & validated_data.keys() or ingredients:
+            transaction.on_commit(
+                lambda: update_search_vector(instance.pk)
+            )
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        # Перечитываем с prefetch: иначе ингредиенты грузятся по одному.
+        instance = Recipe.objects.with_related().get(pk=instance.pk)
         return RecipeSerializer(instance, context=context).data
 
 
 class SubscriptionGetSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
-    recipes = RecipeIntroSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes = serializers.SerializerMethodField()
 
     class Meta:
         model = FoodgramUser
@@ -359,8 +388,13 @@ class SubscriptionGetSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         return get_sub_info(self, obj)
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+    def get_recipes(self, obj):
+        recipes = self.context.get('recipes')
+        if recipes is None:
+            recipes = recipes_by_author(self.context['request'], [obj.pk])
+        return RecipeIntroSerializer(
+            recipes[obj.pk], many=True, context=self.context
+        ).data
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
@@ -387,5 +421,5 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         return SubscriptionGetSerializer(
-            instance.author, context={'request': self.context.get('request')}
+            instance.author, context=self.context
         ).data
@@ -0,0 +1,109 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import FoodgramUser, Subscription
+
+
+class RelationToggle:
+    """Идемпотентное добавление и удаление связей пользователь-объект.
+
+    Добавление — один INSERT ... SELECT ... ON CONFLICT DO NOTHING
+    RETURNING, удаление — один DELETE ... RETURNING: без предварительных
+    exists() и без гонок между проверкой и записью. Возвращается множество id,
+    которые действительно изменились; по нему же сдвигается счетчик.
+    """
+
+    def __init__(self, model, owner, target, counter=None):
+        self.model = model
+        self.owner = model._meta.get_field(owner)
+        self.target = model._meta.get_field(target)
+        self.counter = counter
+
+    def insert_sql(self, owner_id, target_ids):
+        """INSERT ... SELECT из таблицы объектов связи.
+
+        id несуществующих объектов не попадают в выборку, поэтому
+        отдельная проверка существования перед вставкой не нужна.
+        """
+        quote = connection.ops.quote_name
+        fields = [
+            field for field in self.model._meta.local_concrete_fields
+            if not field.primary_key
+        ]
+        obj = self.model(**{self.owner.attname: owner_id})
+        target_table = quote(self.target.related_model._meta.db_table)
+        target_column = (
+            f'{target_table}.{quote(self.target.target_field.column)}'
+        )
+        columns, params = [], []
+        for field in fields:
+            if field is self.target:
+                columns.append(target_column)
+            else:
+                columns.append('%s')
+                params.append(field.get_db_prep_save(
+                    field.pre_save(obj, add=True), connection
+                ))
+        sql = (
+            f'INSERT INTO {quote(self.model._meta.db_table)} '
+            f'({", ".join(quote(field.column) for field in fields)}) '
+            f'SELECT {", ".join(columns)} FROM {target_table} '
+            f'WHERE {target_column} IN '
+            f'({", ".join(["%s"] * len(target_ids))}) '
+            f'ON CONFLICT DO NOTHING RETURNING {quote(self.target.column)}'
+        )
+        return sql, [*params, *target_ids]
+
+    def delete_sql(self, owner_id, target_ids):
+        quote = connection.ops.quote_name
+        sql = (
+            f'DELETE FROM {quote(self.model._meta.db_table)} '
+            f'WHERE {quote(self.owner.column)} = %s '
+            f'AND {quote(self.target.column)} IN '
+            f'({", ".join(["%s"] * len(target_ids))}) '
+            f'RETURNING {quote(self.target.column)}'
+        )
+        return sql, [owner_id, *target_ids]
+
+    def execute(self, sql, params, delta):
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                changed = {row[0] for row in cursor.fetchall()}
+            if changed and self.counter:
+                model, field = self.counter
+                model.objects.filter(pk__in=changed).update(
+                    **{field: F(field) + delta}
+                )
+        return changed
+
+    def add(self, owner_id, *target_ids):
+        """Добавляет связи; id несуществующих объектов в ответ не попадут.
+
+        DoesNotExist — если объект удалили между выборкой и проверкой
+        внешнего ключа.
+        """
+        if not target_ids:
+            return set()
+        try:
+            return self.execute(*self.insert_sql(owner_id, target_ids), 1)
+        except IntegrityError:
+            raise self.target.related_model.DoesNotExist
+
+    def remove(self, owner_id, *target_ids):
+        if not target_ids:
+            return set()
+        return self.execute(*self.delete_sql(owner_id, target_ids), -1)
+
+
+favorites = RelationToggle(
+    Favorite, 'user', 'recipe', counter=(Recipe, 'favorites_count')
+)
+cart = RelationToggle(
+    Cart, 'user', 'recipe', counter=(Recipe, 'in_cart_count')
+)
+subscriptions = RelationToggle(
+    Subscription, 'user', 'author',
+    counter=(FoodgramUser, 'subscribers_count')
+)
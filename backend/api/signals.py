@@ -0,0 +1,59 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.versions import bump_version
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import FoodgramUser
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(**kwargs):
+    bump_version('tags')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version('ingredients')
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    bump_version(f'recipe:{instance.pk}', 'recipes')
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    bump_version(f'recipe:{instance.recipe_id}', 'recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        bump_version(f'recipe:{instance.pk}', 'recipes')
+    elif pk_set:
+        bump_version(*(f'recipe:{pk}' for pk in pk_set), 'recipes')
+
+
+@receiver(post_save, sender=FoodgramUser)
+@receiver(post_delete, sender=FoodgramUser)
+def user_changed(instance, update_fields=None, **kwargs):
+    names = [f'user:{instance.pk}', f'auth:{instance.pk}']
+    # Автор показывается в списке рецептов, но вход пользователя
+    # (обновление last_login) ленту не меняет.
+    if instance.recipes_count and update_fields != {'last_login'}:
+        names.append('recipes')
+    bump_version(*names)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    token_cache.evict(instance.key)
+    bump_version(f'auth:{instance.user_id}')
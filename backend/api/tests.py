@@ -0,0 +1,545 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.models import Version
+from api.views import TagViewSet
+from foodgram.db import use_replica
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.storage import ContentHashStorage
+from users.models import FoodgramUser, Subscription
+
+RECIPES = 25
+THREADS = 8
+# Полное сканирование таблицы в плане: Postgres и SQLite.
+SEQ_SCAN = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(r'^SCAN (\w+)$', re.MULTILINE),
+}
+
+
+def create_user(username):
+    return FoodgramUser.objects.create_user(
+        email=f'{username}@example.com',
+        username=username,
+        password='pass12345',
+        first_name=username,
+        last_name=username,
+    )
+
+
+def create_recipes(authors, count=RECIPES):
+    tags = [
+        Tag.objects.create(name=f'Тэг {number}', color=f'#00000{number}',
+                           slug=f'tag{number}')
+        for number in range(3)
+    ]
+    ingredients = [
+        Ingredient.objects.create(name=f'Ингредиент {number}',
+                                  measurement_unit='г')
+        for number in range(4)
+    ]
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % len(authors)],
+            name=f'Рецепт {number}',
+            image='recipes/test.png',
+            text='Текст',
+            cooking_time=10,
+        )
+        recipe.tags.set(tags[:1 + number % len(tags)])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for ingredient in ingredients[:1 + number % len(ingredients)]
+        )
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [create_user(f'author{number}') for number in range(3)]
+        cls.author = authors[0]
+        cls.user = create_user('reader')
+        recipes = create_recipes(authors)
+        Favorite.objects.bulk_create(
+            Favorite(user=cls.user, recipe=recipe) for recipe in recipes[::2]
+        )
+        Subscription.objects.create(user=cls.user, author=authors[0])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def count_queries(self, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), len(response.data['results'])
+
+    def assert_constant(self, client):
+        client.get('/api/recipes/?limit=1')
+        small, small_size = self.count_queries(client, '/api/recipes/?limit=2')
+        large, large_size = self.count_queries(
+            client, '/api/recipes/?limit=20'
+        )
+        self.assertEqual((small_size, large_size), (2, 20))
+        self.assertEqual(small, large)
+
+    def test_anonymous(self):
+        self.assert_constant(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assert_constant(client)
+
+    def test_cold_authenticated_within_budget(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        budget = settings.QUERY_BUDGETS['RecipeViewSet.list']
+        for url in ('/api/recipes/?page=2',
+                    '/api/recipes/?tags=tag0&tags=tag1&is_favorited=1'
+                    '&search=Рецепт',
+                    f'/api/recipes/?author={self.author.pk}'):
+            with self.subTest(url=url):
+                self.assertLessEqual(
+                    self.count_queries(client, url)[0], budget
+                )
+
+
+class RecipeUpdateQueriesTest(TestCase):
+    """PATCH только текста не трогает ингредиенты и тэги рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipe = create_recipes([cls.author], count=4)[-1]
+        cls.token = Token.objects.create(user=cls.author)
+
+    def test_text_only_patch(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        ingredients = list(
+            self.recipe.recipeingredient_set.values_list('pk', flat=True)
+        )
+        tags = list(self.recipe.tags.values_list('pk', flat=True))
+        tables = (
+            RecipeIngredient._meta.db_table,
+            Recipe.tags.through._meta.db_table,
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = client.patch(
+                f'/api/recipes/{self.recipe.pk}/', {'text': 'Новый текст'},
+                format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['text'], 'Новый текст')
+        writes = [
+            query['sql'] for query in queries
+            if query['sql'].lstrip().startswith(
+                ('INSERT', 'UPDATE', 'DELETE')
+            )
+            and any(f'"{table}"' in query['sql'] for table in tables)
+        ]
+        self.assertEqual(writes, [])
+        self.assertEqual(list(
+            self.recipe.recipeingredient_set.values_list('pk', flat=True)
+        ), ingredients)
+        self.assertEqual(
+            list(self.recipe.tags.values_list('pk', flat=True)), tags
+        )
+
+
+class RelationToggleConcurrencyTest(TransactionTestCase):
+    """Одновременные одинаковые запросы создают одну связь и +1 к счетчику."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('SQLite в памяти не допускает записи из потоков.')
+        self.author = create_user('author')
+        self.user = create_user('reader')
+        self.recipe = create_recipes([self.author], count=1)[0]
+        self.token = Token.objects.create(user=self.user)
+
+    def post_concurrently(self, url):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def post():
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+            try:
+                barrier.wait()
+                statuses.append(client.post(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=post) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def test_favorite(self):
+        statuses = self.post_concurrently(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(statuses, [204] + [400] * (THREADS - 1))
+        self.assertEqual(
+            Favorite.objects.filter(user=self.user).count(), 1
+        )
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+    def test_subscribe(self):
+        statuses = self.post_concurrently(
+            f'/api/users/{self.author.pk}/subscribe/'
+        )
+        self.assertEqual(statuses, [201] + [400] * (THREADS - 1))
+        self.assertEqual(
+            Subscription.objects.filter(user=self.user).count(), 1
+        )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+
+
+class RelationMissingTargetTest(TestCase):
+    """Несуществующий объект — 404 и внутри внешней транзакции."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+
+    def test_subscribe_missing_author(self):
+        response = self.client.post('/api/users/999999/subscribe/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_favorite_missing_recipe(self):
+        response = self.client.post('/api/recipes/999999/favorite/')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_non_numeric_ids(self):
+        for method, url in (
+            ('post', '/api/recipes/abc/favorite/'),
+            ('delete', '/api/recipes/abc/shopping_cart/'),
+            ('post', '/api/users/abc/subscribe/'),
+            ('delete', '/api/users/abc/subscribe/'),
+        ):
+            with self.subTest(method=method, url=url):
+                response = getattr(self.client, method)(url)
+                self.assertEqual(response.status_code, 404)
+
+
+class RelationToggleQueriesTest(TestCase):
+    """Добавление в избранное — без отдельной проверки рецепта."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipes([create_user('author')], count=1)[0]
+        cls.user = create_user('reader')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def test_favorite(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(url)
+        self.assertEqual(response.status_code, 204)
+        recipe_table = f'"{Recipe._meta.db_table}"'
+        self.assertEqual([
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and f'FROM {recipe_table}' in query['sql']
+        ], [])
+        self.assertEqual(client.post(url).status_code, 400)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+
+@override_settings(ALLOWED_HOSTS=['a.example', 'b.example'])
+class AnonymousResponseCacheTest(TestCase):
+    """Закэшированный ответ не отдается под другим хостом или схемой."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipes([create_user('author')], count=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, host, secure=False):
+        return APIClient().get(
+            '/api/recipes/', HTTP_HOST=host, secure=secure
+        )
+
+    def test_host_in_key(self):
+        first = self.get('a.example')
+        self.assertIn(b'http://a.example/', first.content)
+        other = self.get('b.example')
+        self.assertNotIn('X-Response-Cache', other)
+        self.assertNotIn(b'a.example', other.content)
+        self.assertIn(b'http://b.example/', other.content)
+        self.assertEqual(self.get('b.example')['X-Response-Cache'], 'hit')
+
+    def test_scheme_in_key(self):
+        self.get('a.example')
+        secure = self.get('a.example', secure=True)
+        self.assertNotIn('X-Response-Cache', secure)
+        self.assertIn(b'https://a.example/', secure.content)
+
+
+class VersionReadTest(TestCase):
+    """Чтение меток версий ничего не пишет в БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = create_recipes([create_user('author')], count=1)[0]
+        Version.objects.all().delete()
+
+    def assert_no_writes(self, url, status_code):
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual([
+            query['sql'] for query in queries
+            if not query['sql'].lstrip().startswith('SELECT')
+        ], [])
+
+    def test_reads(self):
+        self.assert_no_writes('/api/tags/', 200)
+        self.assert_no_writes(f'/api/recipes/{self.recipe.pk}/', 200)
+        self.assert_no_writes('/api/recipes/999999/', 404)
+        self.assert_no_writes('/api/recipes/abc/', 404)
+        self.assertFalse(Version.objects.exists())
+
+
+class IngredientSearchQueriesTest(TestCase):
+    """Поиск ингредиентов читает метку версии один раз на запрос."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(5):
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+
+    def search(self, client, found=5):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/ingredients/?name=ингр')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), found)
+        return [query['sql'] for query in queries]
+
+    def test_one_version_read(self):
+        client = APIClient()
+        self.search(client)
+        queries = self.search(client)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('"api_version"', queries[0])
+
+    def test_rebuild_after_bump(self):
+        client = APIClient()
+        self.search(client)
+        Ingredient.objects.create(name='Ингредиент 5', measurement_unit='г')
+        self.assertEqual(len(self.search(client, found=6)), 2)
+
+
+class ReplicaLagTest(TestCase):
+    """Сразу после сдвига версии ответ строится по основной БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Tag.objects.create(name='Тэг', color='#000000', slug='tag')
+
+    def replica_flags(self):
+        flags = []
+
+        def get_queryset(view):
+            flags.append(use_replica.get())
+            return Tag.objects.all()
+
+        cache.clear()
+        with mock.patch.object(TagViewSet, 'get_queryset', get_queryset):
+            response = APIClient().get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        return set(flags)
+
+    def test_fresh_version_reads_primary(self):
+        self.assertEqual(self.replica_flags(), {False})
+
+    def test_old_version_reads_replica(self):
+        Version.objects.filter(name='tags').update(stamp=time.time() - 3600)
+        self.assertEqual(self.replica_flags(), {True})
+
+
+class QueryPlanTest(TestCase):
+    """SQL нагруженных эндпоинтов идет по индексам.
+
+    Планы строятся для запросов, которые действительно выполнили
+    представления, а не для их копий: новый запрос в представлении
+    проверяется автоматически.
+    """
+    URLS = (
+        '/api/recipes/',
+        '/api/recipes/?author={author}',
+        '/api/recipes/?tags=tag0',
+        '/api/recipes/?is_favorited=1',
+        '/api/recipes/?is_in_shopping_cart=1',
+        '/api/recipes/?cursor=',
+        '/api/recipes/{recipe}/',
+        '/api/recipes/feed/',
+        '/api/recipes/download_shopping_cart/?format=txt',
+        '/api/users/subscriptions/',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.user = create_user('reader')
+        cls.recipes = create_recipes([cls.author], count=4)
+        Subscription.objects.create(user=cls.user, author=cls.author)
+        for model in (Favorite, Cart):
+            model.objects.create(user=cls.user, recipe=cls.recipes[0])
+        cls.token = Token.objects.create(user=cls.user)
+
+    def captured_selects(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        selects = {}
+        for url in self.URLS:
+            url = url.format(author=self.author.pk, recipe=self.recipes[0].pk)
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            for query in queries:
+                if query['sql'].startswith('SELECT'):
+                    selects.setdefault(query['sql'], url)
+        return selects
+
+    def explain(self, sql):
+        prefix = (
+            'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+            else 'EXPLAIN '
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def test_no_seq_scans(self):
+        if connection.vendor not in SEQ_SCAN:
+            self.skipTest(f'Нет разбора планов для {connection.vendor}.')
+        selects = self.captured_selects()
+        if connection.vendor == 'postgresql':
+            # На тестовых объемах таблица целиком дешевле индекса.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        tables = set(connection.introspection.table_names())
+        for sql, url in selects.items():
+            plan = self.explain(sql)
+            with self.subTest(url=url, sql=sql[:80]):
+                scanned = SEQ_SCAN[connection.vendor].findall(plan)
+                self.assertEqual(
+                    [table for table in scanned if table in tables], [], plan
+                )
+
+
+class FeedThresholdTest(TestCase):
+    """Рецепты, вышедшие у популярного автора, остаются в лентах, когда
+    автор опускается ниже FANOUT_LIMIT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.reader = create_user('reader')
+        cls.other = create_user('other')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def feed_ids(self, client):
+        response = client.get('/api/recipes/feed/')
+        return [recipe['id'] for recipe in response.data['results']]
+
+    @mock.patch('api.feed.FANOUT_LIMIT', 2)
+    def test_recipes_return_to_feed(self):
+        reader = self.client_for(self.reader)
+        other = self.client_for(self.other)
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        self.assertEqual(reader.post(url).status_code, 201)
+        self.assertEqual(other.post(url).status_code, 201)
+        # Автор популярен: рецепт в ленты не раскладывается.
+        recipe = create_recipes([self.author], count=1)[0]
+        self.assertEqual(self.feed_ids(reader), [recipe.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(other.delete(url).status_code, 204)
+        self.assertEqual(self.feed_ids(reader), [recipe.pk])
+
+
+class ContentHashStorageDeleteTest(SimpleTestCase):
+    """Сборщик изображений не удаляет файл, который снова сохранили."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.storage = ContentHashStorage(location=directory.name)
+        self.name = self.storage.save('recipes/a.png', ContentFile(b'png'))
+        self.path = self.storage.path(self.name)
+        self.old = time.time() - 3600
+        os.utime(self.path, (self.old, self.old))
+
+    def test_deletes_stale(self):
+        self.assertEqual(self.storage.delete_unused(self.name, self.old), 3)
+        self.assertFalse(self.storage.exists(self.name))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [])
+
+    def test_keeps_reused(self):
+        self.assertEqual(
+            self.storage.save('recipes/b.png', ContentFile(b'png')),
+            self.name
+        )
+        self.assertIsNone(self.storage.delete_unused(self.name, self.old))
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), [
+            os.path.basename(self.path)
+        ])
+
+    def test_save_after_claim_rewrites(self):
+        os.remove(self.path)
+        # Сборщик забрал файл между exists() и os.utime() в save.
+        exists = mock.patch.object(
+            self.storage, 'exists', side_effect=[True, False]
+        )
+        with exists:
+            self.storage.save('recipes/b.png', ContentFile(b'png'))
+        with self.storage.open(self.name) as file:
+            self.assertEqual(file.read(), b'png')
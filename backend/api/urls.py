@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
+from api.metrics import metrics_view
 from api.views import (IngredientViewSet, RecipeViewSet,
-                       TagViewSet, CustomUserViewSet)
+                       TagViewSet, CustomUserViewSet, database_stats)
 
 app_name = 'api'
 
@@ -12,10 +15,24 @@ router.register('ingredients', IngredientViewSet, basename='ingredient')
 router.register('recipes', RecipeViewSet, basename='recipe')
 router.register('users', CustomUserViewSet, basename='users')
 
-urlpatterns = [
+# Асинхронное чтение для режима ASGI, см. api.async_views.
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list_view),
+    path('recipes/<int:pk>/', async_views.recipe_detail_view),
+    path('tags/', async_views.tag_list_view),
+    path('tags/<int:pk>/', async_views.tag_detail_view),
+    path('ingredients/', async_views.ingredient_list_view),
+    path('ingredients/<int:pk>/', async_views.ingredient_detail_view),
+]
+
+urlpatterns = [*async_urlpatterns] if settings.ASGI_MODE else []
+
+urlpatterns += [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
+    path('db/stats/', database_stats, name='database_stats'),
+    path('metrics/', metrics_view, name='metrics'),
     path(
         'recipes/download_shopping_list/',
         RecipeViewSet.as_view({'get': 'download_shopping_cart'}),
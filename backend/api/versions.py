@@ -0,0 +1,104 @@
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from api.models import Version
+
+KEY = 'version:{}'
+# Метка имени, которое еще ни разу не сдвигалось.
+DEFAULT_STAMP = 0.0
+
+
+def shared_cache():
+    """Кэш по умолчанию общий для воркеров (Redis и т. п.), а не в памяти."""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def load_versions(names):
+    """Метки из таблицы Version; для имен без строки — DEFAULT_STAMP.
+
+    Чтение ничего не пишет: строки создает только bump_version, так что
+    запросы к несуществующим объектам не плодят меток.
+    Читается всегда основная БД: реплика может отставать от сдвига.
+    """
+    found = dict.fromkeys(names, DEFAULT_STAMP)
+    found.update(
+        Version.objects.using(DEFAULT_DB_ALIAS)
+        .filter(name__in=names).values_list('name', 'stamp')
+    )
+    return found
+
+
+def get_versions(*names):
+    """Возвращает метки версий (unix time изменения) по именам.
+
+    Метки хранятся в БД, чтобы сдвиг в одном воркере сразу видели
+    остальные. Общий кэш, если он настроен, служит только для чтения
+    без запроса к БД; кэш в памяти процесса не используется.
+    """
+    found = {}
+    if shared_cache():
+        cached = cache.get_many([KEY.format(name) for name in names])
+        found = {
+            name: cached[KEY.format(name)]
+            for name in names if KEY.format(name) in cached
+        }
+    missing = [name for name in names if name not in found]
+    if missing:
+        loaded = load_versions(missing)
+        if shared_cache():
+            # add, а не set: сдвиг, записанный в кэш между чтением БД
+            # и этой строкой, не перетирается старым значением.
+            for name, stamp in loaded.items():
+                cache.add(KEY.format(name), stamp, timeout=None)
+        found.update(loaded)
+    return [found[name] for name in names]
+
+
+def get_version(name):
+    return get_versions(name)[0]
+
+
+def not_bumped_yet(names):
+    """Имена, которые в текущей транзакции еще не сдвигались.
+
+    Удаление рецепта или его ингредиентов шлет post_delete на каждую
+    строку, и без этого каждая давала бы свой UPSERT одной и той же
+    метки. Транзакцию отличает список run_on_commit соединения: Django
+    заменяет его новым при фиксации, откате и откате к точке сохранения,
+    так что после отката метки сдвигаются заново.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return names
+    marker, bumped = getattr(connection, '_bumped_versions', (None, None))
+    if marker is not connection.run_on_commit:
+        bumped = set()
+        connection._bumped_versions = (connection.run_on_commit, bumped)
+    names = names - bumped
+    bumped |= names
+    return names
+
+
+def bump_version(*names):
+    names = not_bumped_yet(set(names))
+    if not names:
+        return
+    # Один порядок строк во всех транзакциях — без взаимных блокировок.
+    names = sorted(names)
+    now = time.time()
+    Version.objects.bulk_create(
+        [Version(name=name, stamp=now) for name in names],
+        update_conflicts=True,
+        unique_fields=['name'],
+        update_fields=['stamp']
+    )
+    if shared_cache():
+        # Пока транзакция не зафиксирована, остальные воркеры должны
+        # видеть прежнюю метку вместе с прежними данными.
+        transaction.on_commit(lambda: cache.set_many(
+            {KEY.format(name): now for name in names}, timeout=None
+        ))
@@ -1,51 +1,92 @@
-from django.db.models import Sum
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from rest_framework import filters, status
-from rest_framework.decorators import action
+from rest_framework import generics, status
+from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import (AllowAny, IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.cart import shopping_cart_pdf
-from api.filters import IngredientSearch, RecipeFilter
-from api.pagination import LimitNumberPagination
+from api import services
+from api.autocomplete import ingredient_index
+from api.cart import SHOPPING_LIST_FORMATS, shopping_list
+from api.feed import backfill, drop, feed_page
+from api.filters import RecipeFilter
+from api.dbstats import pool_stats
+from api.mixins import ConditionalGetMixin, ReplicaReadMixin
+from api.pagination import (FeedPagination, LimitNumberPagination,
+                            RecipePagination, SubscriptionPagination)
 from api.permissions import IsOwnerOrReadOnly, ReadOnly
-from api.serializers import (CartSerializer, FavoritesSerializer,
-                             IngredientSerializer, RecipeCreateSerializer,
-                             RecipeIntroSerializer, RecipeSerializer,
-                             SubscriptionSerializer, TagSerializer)
-from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredient, Tag)
+from api.readers import RecipeReader, recipe_rows
+from api.relations import invalidate_relations
+from api.renderers import SHOPPING_LIST_RENDERERS, FastJSONRenderer
+from api.serializers import (IngredientSerializer, RecipeCreateSerializer,
+                             RecipeIdsSerializer, RecipeIntroSerializer,
+                             RecipeSerializer, SubscriptionGetSerializer,
+                             SubscriptionSerializer, TagSerializer,
+                             recipes_by_author)
+from recipes.models import Ingredient, Recipe, Tag
 from users.models import FoodgramUser, Subscription
 from .serializers import CreateUserSerializer, UserInfoSerializer
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+RECIPE_LIST_VERSIONS = ('recipes', 'tags', 'ingredients')
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяет счетчик одним UPDATE с F()."""
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+class TagViewSet(ReplicaReadMixin, ConditionalGetMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_class = [IsAdminUser | ReadOnly]
     pagination_class = None
+    cache_max_age = 60
 
+    def get_version_names(self):
+        return ('tags',)
 
-class IngredientViewSet(ModelViewSet):
+
+class IngredientViewSet(ReplicaReadMixin, ConditionalGetMixin, ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = [IsAdminUser | ReadOnly]
     pagination_class = None
-    filter_backends = (DjangoFilterBackend, filters.SearchFilter)
-    filterset_class = IngredientSearch
+    cache_max_age = 60
 
+    def get_version_names(self):
+        return ('ingredients',)
 
-class RecipeViewSet(ModelViewSet):
-    queryset = Recipe.objects.all()
-    pagination_class = LimitNumberPagination
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.search, request)
+
+    def search(self, request):
+        return Response(
+            ingredient_index.search(
+                request.query_params.get('name', ''),
+                version=request.versions['ingredients']
+            )
+        )
+
+
+class RecipeViewSet(ReplicaReadMixin, ConditionalGetMixin, ModelViewSet):
+    # Нечисловой id — 404 роутера, а не ошибка int() в действиях.
+    lookup_value_regex = r'\d+'
+    pagination_class = RecipePagination
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
     ordering_fields = ('pub_date',)
     ordering = ('pub_date',)
+    anonymous_cache_actions = ('list', 'retrieve')
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
 
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
@@ -54,8 +95,60 @@ class RecipeViewSet(ModelViewSet):
             return RecipeIntroSerializer
         return RecipeSerializer
 
+    def get_queryset(self):
+        queryset = Recipe.objects.all()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related()
+        return queryset
+
+    def get_version_names(self):
+        if self.action == 'list':
+            return RECIPE_LIST_VERSIONS
+        # 404 до построения имен: несуществующий рецепт не получает меток.
+        # Основная БД: только что созданный рецепт реплика может не видеть.
+        pk, author_id = generics.get_object_or_404(
+            Recipe.objects.using(DEFAULT_DB_ALIAS).values_list(
+                'pk', 'author_id'
+            ),
+            pk=self.kwargs['pk']
+        )
+        return (f'recipe:{pk}', 'tags', 'ingredients', f'user:{author_id}')
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(self.read_list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(self.read_one, request, *args, **kwargs)
+
+    def read_list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return ModelViewSet.list(self, request, *args, **kwargs)
+        queryset = self.filter_queryset(Recipe.objects.all())
+        page = self.paginate_queryset(recipe_rows(queryset))
+        return self.get_paginated_response(RecipeReader(request).build(page))
+
+    def read_one(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return ModelViewSet.retrieve(self, request, *args, **kwargs)
+        row = generics.get_object_or_404(
+            recipe_rows(Recipe.objects.all()), pk=self.kwargs['pk']
+        )
+        return Response(RecipeReader(request).build([row])[0])
+
+    def get_renderers(self):
+        if self.action == 'download_shopping_cart':
+            return [renderer() for renderer in SHOPPING_LIST_RENDERERS]
+        return super().get_renderers()
+
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        change_counter(FoodgramUser, self.request.user.pk, 'recipes_count', 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+        change_counter(FoodgramUser, instance.author_id, 'recipes_count', -1)
 
     def get_permissions(self):
         if self.action == 'create':
@@ -63,69 +156,131 @@ class RecipeViewSet(ModelViewSet):
         elif self.action in ('update', 'partial_update',
                              'destroy', 'download_shopping_cart'):
             return [IsOwnerOrReadOnly(), ]
-        elif self.action in ('favorite', 'shopping_cart'):
+        elif self.action in ('favorite', 'delete_favorite',
+                             'shopping_cart', 'shopping_cart_del',
+                             'favorite_bulk', 'delete_favorite_bulk',
+                             'shopping_cart_bulk',
+                             'delete_shopping_cart_bulk', 'feed'):
             return [IsAuthenticated(), ]
         return [AllowAny(), ]
 
-    def add_item(self, model, serializer, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        user = request.user
-        if model.objects.filter(
-            user=user,
-            recipe__id=pk
-        ).exists():
+    def add_item(self, toggle, request, pk=None):
+        try:
+            added = toggle.add(request.user.pk, int(pk))
+        except Recipe.DoesNotExist:
+            raise Http404
+        if not added:
+            # Пустой RETURNING: связь уже есть или рецепта нет.
+            get_object_or_404(Recipe, pk=pk)
             return Response(
                 {'message': 'Рецепт уже добавлен'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        item = model.objects.create(
-            recipe=recipe,
-            user=request.user
-        )
-        serializer = serializer(item)
-        return Response(serializer.data, status=status.HTTP_204_NO_CONTENT)
+        invalidate_relations(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
-    def delete_item(self, model, request, pk=None):
-        try:
-            item = model.objects.get(recipe=pk, user=request.user)
-            item.delete()
-        except model.DoesNotExist:
+    def delete_item(self, toggle, request, pk=None):
+        if not toggle.remove(request.user.pk, int(pk)):
+            get_object_or_404(Recipe, pk=pk)
             return Response(
                 {'message': 'Невозможно удалить, этого рецепта нет в списке'},
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        invalidate_relations(request)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def bulk_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        found = set(
+            Recipe.objects.filter(pk__in=ids).values_list('pk', flat=True)
+        )
+        return ids, found
+
+    def bulk_response(self, request, ids, found, changed, status_changed,
+                      status_unchanged):
+        invalidate_relations(request)
+        return Response({'results': [
+            {
+                'id': pk,
+                'status': (
+                    'not_found' if pk not in found
+                    else status_changed if pk in changed
+                    else status_unchanged
+                )
+            }
+            for pk in ids
+        ]})
+
+    def add_items(self, toggle, request):
+        ids, found = self.bulk_ids(request)
+        added = toggle.add(request.user.pk, *found)
+        return self.bulk_response(
+            request, ids, found, added, 'added', 'already_added'
+        )
+
+    def delete_items(self, toggle, request):
+        ids, found = self.bulk_ids(request)
+        removed = toggle.remove(request.user.pk, *found)
+        return self.bulk_response(
+            request, ids, found, removed, 'removed', 'not_in_list'
+        )
+
+    @action(methods=['post'], detail=False, url_path='favorite',
+            url_name='favorite-bulk')
+    def favorite_bulk(self, request):
+        return self.add_items(services.favorites, request)
+
+    @favorite_bulk.mapping.delete
+    def delete_favorite_bulk(self, request):
+        return self.delete_items(services.favorites, request)
+
+    @action(methods=['post'], detail=False, url_path='shopping_cart',
+            url_name='shopping-cart-bulk')
+    def shopping_cart_bulk(self, request):
+        return self.add_items(services.cart, request)
+
+    @shopping_cart_bulk.mapping.delete
+    def delete_shopping_cart_bulk(self, request):
+        return self.delete_items(services.cart, request)
+
     @action(methods=['post'], detail=True)
     def favorite(self, request, pk=None):
-        return self.add_item(Favorite, FavoritesSerializer, request, pk)
+        return self.add_item(services.favorites, request, pk)
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk=None):
-        return self.delete_item(Favorite, request, pk)
+        return self.delete_item(services.favorites, request, pk)
 
     @action(methods=['post'], detail=True)
     def shopping_cart(self, request, pk=None):
-        return self.add_item(Cart, CartSerializer, request, pk)
+        return self.add_item(services.cart, request, pk)
 
     @shopping_cart.mapping.delete
     def shopping_cart_del(self, request, pk=None):
-        return self.delete_item(Cart, request, pk)
+        return self.delete_item(services.cart, request, pk)
 
     @action(methods=['get'], detail=False)
-    def download_shopping_cart(self, request):
-        user = request.user
-        recipes = Recipe.objects.filter(cart__user=user)
-        shopping_list = (
-            RecipeIngredient.objects.filter(recipe__in=recipes)
-            .values('ingredient')
-            .annotate(total_amount=Sum('amount'))
+    def feed(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_feed(
+            request,
+            lambda after, limit: feed_page(request.user, after, limit)
         )
-        response = shopping_cart_pdf(shopping_list)
-        return response
+        serializer = RecipeSerializer(
+            page, many=True, context={'request': request}
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(methods=['get'], detail=False)
+    def download_shopping_cart(self, request):
+        export = SHOPPING_LIST_FORMATS[request.accepted_renderer.format]
+        return export(shopping_list(request.user).iterator())
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, UserViewSet):
+    lookup_value_regex = r'\d+'
     queryset = FoodgramUser.objects.all()
     pagination_class = LimitNumberPagination
     permission_classes = (AllowAny,)
@@ -162,36 +317,44 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscribe(self, request, id):
-        author = get_object_or_404(FoodgramUser, pk=id)
         user = request.user
 
         if request.method == 'POST':
-            if Subscription.objects.filter(
-                user=user, author=author
-            ).exists():
+            if str(user.pk) == str(id):
+                raise ValidationError(
+                    {'non_field_errors': ['Нельзя подписаться на себя.']}
+                )
+            # Автор нужен для ответа и для backfill ленты.
+            author = get_object_or_404(FoodgramUser, pk=id)
+            try:
+                added = services.subscriptions.add(user.pk, author.pk)
+            except FoodgramUser.DoesNotExist:
+                raise Http404
+            if not added:
                 return Response(
                     {'message': 'Вы уже подписаны!'},
                     status=status.HTTP_400_BAD_REQUEST)
-            serializer = SubscriptionSerializer(
-                data={'user': request.user.pk,
-                      'author': author.pk},
-                context={'request': request},
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
+            invalidate_relations(request)
+            # Счетчик уже сдвинут в БД через F(); для is_popular в backfill.
+            author.subscribers_count += 1
+            backfill(user.pk, author)
             return Response(
-                serializer.data,
+                SubscriptionGetSerializer(
+                    author,
+                    context={'request': request}
+                ).data,
                 status=status.HTTP_201_CREATED
             )
 
-        subscription = Subscription.objects.filter(
-            user=request.user,
-            author=author
-        )
-        if subscription.exists():
-            subscription.delete()
+        with transaction.atomic():
+            removed = services.subscriptions.remove(user.pk, int(id))
+            if removed:
+                drop(user.pk, int(id))
+        if removed:
+            invalidate_relations(request)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+        get_object_or_404(FoodgramUser, pk=id)
         return Response(
             {'message': 'Вы не были подписаны ранее!'},
             status=status.HTTP_400_BAD_REQUEST,
@@ -201,13 +364,27 @@ class CustomUserViewSet(UserViewSet):
             permission_classes=(IsAuthenticated,))
     def subscriptions(self, request):
         user = self.request.user
-        subscriptions = Subscription.objects.filter(user=user)
-        paginator = LimitNumberPagination()
+        subscriptions = Subscription.objects.filter(
+            user=user
+        ).select_related('author').order_by('-date_added', '-id')
+        paginator = SubscriptionPagination()
         result_page = paginator.paginate_queryset(subscriptions, request)
         serializer = SubscriptionSerializer(
             result_page,
             many=True,
-            context={'request': request}
+            context={
+                'request': request,
+                'recipes': recipes_by_author(
+                    request,
+                    [subscription.author_id for subscription in result_page]
+                ),
+            }
         )
 
         return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def database_stats(request):
+    return Response(pool_stats())
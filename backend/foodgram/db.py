@@ -0,0 +1,29 @@
+import contextvars
+
+from django.conf import settings
+
+REPLICA = 'replica'
+
+use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+class ReadReplicaRouter:
+    """Направляет чтение на реплику внутри помеченных запросов.
+
+    Флаг use_replica выставляет ReplicaReadMixin только для действий
+    list/retrieve, все записи и остальные чтения идут в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == 'default'
@@ -35,6 +35,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -66,17 +67,48 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+# Под ASGI (gunicorn с uvicorn-воркерами) чтение рецептов, тэгов
+# и ингредиентов обслуживают асинхронные представления api.async_views.
+ASGI_MODE = os.getenv('FOODGRAM_ASGI', '') == '1'
+
+# Постоянные соединения с проверкой перед каждым запросом. Если задан
+# FOODGRAM_DB_POOLER (хост PgBouncer в режиме transaction), соединения
+# идут через него, а серверные курсоры отключаются.
+DB_POOLER = os.getenv('FOODGRAM_DB_POOLER', '')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': os.getenv('POSTGRES_DB', 'django'),
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'HOST': DB_POOLER or os.getenv('DB_HOST', ''),
+        'PORT': (
+            os.getenv('FOODGRAM_DB_POOLER_PORT', 6432) if DB_POOLER
+            else os.getenv('DB_PORT', 5432)
+        ),
+        'CONN_MAX_AGE': int(os.getenv('FOODGRAM_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': bool(DB_POOLER),
     }
 }
 
+# Реплика для чтения в list/retrieve, см. foodgram.db.ReadReplicaRouter.
+if os.getenv('FOODGRAM_DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.getenv('FOODGRAM_DB_REPLICA_HOST'),
+        'PORT': os.getenv('FOODGRAM_DB_REPLICA_PORT', 5432),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Сколько секунд после сдвига версии ответ строится по основной БД:
+# реплика может еще не видеть изменение, а тело ответа кэшируется
+# и получает ETag уже по новой метке.
+REPLICA_MAX_LAG = int(os.getenv('FOODGRAM_REPLICA_MAX_LAG', 60))
+
+DATABASE_ROUTERS = ['foodgram.db.ReadReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -105,6 +137,53 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Процессы для генерации превью изображений; 0 — синхронно в запросе.
+IMAGE_WORKERS = int(os.getenv('FOODGRAM_IMAGE_WORKERS', 2))
+
+# Кэш токенов авторизации: размер LRU, время жизни записи в секундах
+# и алиас из CACHES для общего между воркерами кэша (пусто — только LRU).
+TOKEN_CACHE_SIZE = int(os.getenv('FOODGRAM_TOKEN_CACHE_SIZE', 4096))
+TOKEN_CACHE_TTL = int(os.getenv('FOODGRAM_TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_ALIAS = os.getenv('FOODGRAM_TOKEN_CACHE_ALIAS') or None
+
+# Общий кэш воркеров (Redis) для версий, ответов и токенов; без
+# FOODGRAM_CACHE_URL — кэш в памяти процесса, и тогда метки версий
+# читаются из БД (api.versions), а кэш токенов выключен.
+CACHES = {
+    'default': (
+        {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('FOODGRAM_CACHE_URL'),
+        } if os.getenv('FOODGRAM_CACHE_URL')
+        else {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+    ),
+}
+
+# Кэш готовых ответов списка и карточки рецепта для анонимов.
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('FOODGRAM_RESPONSE_CACHE_TTL', 300))
+
+# Бюджет SQL-запросов на запрос: по умолчанию и для отдельных
+# эндпоинтов (ViewSet.action). Превышение пишется в лог foodgram.queries.
+# Значения — измеренный максимум для холодного кэша без общего Redis
+# (метки версий и множества связей читаются из БД) у авторизованного
+# пользователя, вместе с запросами транзакций и колбэков on_commit.
+QUERY_BUDGET = int(os.getenv('FOODGRAM_QUERY_BUDGET', 10))
+QUERY_BUDGETS = {
+    'RecipeViewSet.list': 10,
+    'RecipeViewSet.retrieve': 9,
+    'RecipeViewSet.create': 24,
+    'RecipeViewSet.update': 19,
+    'RecipeViewSet.partial_update': 19,
+    'RecipeViewSet.destroy': 15,
+    'RecipeViewSet.download_shopping_cart': 2,
+    'CustomUserViewSet.subscribe': 18,
+    'CustomUserViewSet.subscriptions': 8,
+}
+
+# Адреса, с которых доступен /api/metrics/ для Prometheus.
+INTERNAL_IPS = os.getenv('FOODGRAM_INTERNAL_IPS', '127.0.0.1').split()
+
 STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'static'
 
@@ -113,7 +192,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
@@ -0,0 +1,16 @@
+import multiprocessing
+import os
+
+# FOODGRAM_ASGI=1 — uvicorn-воркеры и асинхронное чтение (api.async_views).
+ASGI = os.getenv('FOODGRAM_ASGI', '') == '1'
+
+wsgi_app = 'foodgram.asgi:application' if ASGI else 'foodgram.wsgi:application'
+worker_class = 'uvicorn.workers.UvicornWorker' if ASGI else 'sync'
+bind = '0.0.0.0:8000'
+workers = int(os.getenv(
+    'GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1
+))
+timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
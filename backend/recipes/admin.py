@@ -1,5 +1,4 @@
 from django.contrib import admin
-from django.db.models import Count
 from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
@@ -30,11 +29,6 @@ class RecipeAdmin(admin.ModelAdmin):
 
     count_favorites.short_description = 'Added to favorites'
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        queryset = queryset.annotate(favorites_count=Count('favorites'))
-        return queryset
-
 
 class IngredientResourse(resources.ModelResource):
     class Meta:
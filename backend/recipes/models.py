@@ -1,8 +1,13 @@
 from colorfield.fields import ColorField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
 
-from users.models import FoodgramUser
+from recipes.storage import ContentHashStorage
+from users.models import CounterFieldsMixin, FoodgramUser
 
 MAX_LENGTH = 200
 MIN_TIME = 1
@@ -47,12 +52,60 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_name_measurement_unit'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['name'],
+                opclasses=['varchar_pattern_ops'],
+                name='ingredient_name_prefix_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_related(self):
+        """Подгружает автора, тэги и ингредиенты разом для всей страницы."""
+        return self.defer('search_vector').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
+
+    def latest_by_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом.
+
+        Номер рецепта внутри автора считает ROW_NUMBER() OVER
+        (PARTITION BY author_id), так что объем выборки ограничен
+        limit * len(author_ids) при любом числе рецептов у авторов.
+        """
+        queryset = self.filter(author_id__in=author_ids).order_by(
+            'author_id', '-pub_date', '-id'
+        )
+        if limit is None:
+            return queryset
+        return queryset.annotate(
+            position=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('pub_date').desc(), F('id').desc())
+            )
+        ).filter(position__lte=limit)
+
+
+class Recipe(CounterFieldsMixin, models.Model):
 
     author = models.ForeignKey(
         FoodgramUser,
@@ -66,7 +119,8 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         verbose_name='Изображение',
-        upload_to='recipes/'
+        upload_to='recipes/',
+        storage=ContentHashStorage()
     )
     text = models.TextField(
         verbose_name='Текст рецепта',
@@ -94,11 +148,44 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True
     )
+    search_vector = SearchVectorField(
+        verbose_name='Поисковый вектор',
+        null=True,
+        editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    in_cart_count = models.PositiveIntegerField(
+        verbose_name='В корзинах',
+        default=0,
+        editable=False
+    )
+
+    counter_fields = ('favorites_count', 'in_cart_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            GinIndex(
+                fields=['search_vector'],
+                name='recipe_search_vector_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -220,3 +307,51 @@ class Cart(models.Model):
 
         def __str__(self):
             return f'{self.user} добавил {self.recipe} в корзину'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика, записывается при публикации."""
+    user = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        FoodgramUser,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = (
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_user_recipe'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
@@ -0,0 +1,69 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK = 64 * 1024
+CLAIMED_SUFFIX = '.deleting'
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Хранит файлы по sha256 содержимого: recipes/ab/abcdef….png.
+
+    Одинаковые файлы записываются один раз и разделяются рецептами,
+    содержимое по имени никогда не меняется, поэтому такие URL можно
+    кэшировать бессрочно. Неиспользуемые файлы удаляет команда
+    collect_recipe_images.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Файл снова в деле: свежее время изменения не даст
+            # collect_recipe_images удалить его по --min-age.
+            try:
+                os.utime(self.path(name))
+                return name
+            except FileNotFoundError:
+                # Сборщик успел забрать файл: записываем заново.
+                pass
+        return super().save(name, content, max_length=max_length)
+
+    def delete_unused(self, name, threshold):
+        """Удаляет файл, если его время изменения не позже threshold.
+
+        Файл сначала атомарно переименовывается. save, успевший до этого
+        найти файл, уже обновил время изменения, и файл возвращается на
+        место; save после переименования файла не найдет и запишет его
+        заново. Возвращает размер удаленного файла или None.
+        """
+        path = self.path(name)
+        claimed = f'{path}.{uuid.uuid4().hex}{CLAIMED_SUFFIX}'
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        stat = os.stat(claimed)
+        if stat.st_mtime > threshold:
+            os.rename(claimed, path)
+            return None
+        os.remove(claimed)
+        return stat.st_size
@@ -5,7 +5,8 @@ from users.models import FoodgramUser, Subscription
 
 @admin.register(FoodgramUser)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('email', 'username', 'first_name', 'last_name')
+    list_display = ('email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'subscribers_count')
     list_filter = ('email', 'first_name')
 
 
@@ -7,7 +7,33 @@ MAX_LENGTH_EMAIL = 254
 MAX_LENGTH_USERNAME = 150
 
 
-class FoodgramUser(AbstractUser):
+class CounterFieldsMixin:
+    """Не дает обычному save() перезаписать счетчики.
+
+    Счетчики из counter_fields меняются только выражениями F() и командой
+    rebuild_counters, а значения в памяти объекта могут быть устаревшими.
+    Поэтому при сохранении существующей строки без update_fields
+    обновляются все поля, кроме счетчиков.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+            and not self._state.adding
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class FoodgramUser(CounterFieldsMixin, AbstractUser):
 
     email = models.EmailField(
         'email-адрес',
@@ -25,6 +51,17 @@ class FoodgramUser(AbstractUser):
             )]
         )
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+        editable=False
+    )
+    counter_fields = ('recipes_count', 'subscribers_count')
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -72,10 +109,16 @@ class Subscription(models.Model):
         verbose_name_plural = 'Подписки'
         constraints = (
             models.UniqueConstraint(
-                fields=['author', 'user'],
+                fields=['user', 'author'],
                 name='unique_author_user'
             ),
         )
+        indexes = (
+            models.Index(
+                fields=['user', '-date_added', '-id'],
+                name='subscription_user_date_idx'
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.user.username} подписан на: {self.author.username}'